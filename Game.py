@@ -1,616 +1,2646 @@
-# -*- coding: utf-8 -*-
-#Created on Tue Apr 29 2025
-
-
-# Import
-import pygame
-import random
-import time
-import os
-import math
-from enum import Enum
-
-# Initialize pygame and mixer
-try:
-    pygame.init()
-    pygame.mixer.init()
-except pygame.error as e:
-    print(f"Pygame initialization failed: {e}")
-    exit(1)
-
-# Game window setup
-WIDTH = 800
-HEIGHT = 600
-try:
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("Simple Game")
-except pygame.error as e:
-    print(f"Failed to set up display: {e}")
-    exit(1)
-
-# Colors
-BLACK = (0, 0, 0)
-WHITE = (255, 255, 255)
-GREEN = (70, 248, 160)
-GRAY = (210, 210, 210)
-RED = (255, 0, 0)
-BLUE = (0, 0, 255)
-YELLOW = (255, 255, 0)
-BROWN = (139, 69, 19)
-
-# Configuration constants
-CONFIG = {
-    'ROAD_WIDTH': 350,
-    'ROAD_X': (WIDTH - 350) // 2,
-    'MARKER_WIDTH': 10,
-    'MARKER_HEIGHT': 50,
-    'CAR_WIDTH': 40,
-    'CAR_HEIGHT': 100,
-    'MAX_SPEED': 15,
-    'ACCELERATION': 0.20,
-    'DECELERATION': 0.05,
-    'TURN_SPEED': 0.3,
-    'TREE_WIDTH': 80,
-    'TREE_HEIGHT': 80,
-    'FLAG_WIDTH': 40,
-    'FLAG_HEIGHT': 80,
-    'BARRIER_WIDTH': 80,
-    'BARRIER_HEIGHT': 50,
-    'PERSON_WIDTH': 30,
-    'PERSON_HEIGHT': 90,
-    'FPS': 60,
-    'OPPONENT_MIN_INTERVAL': 1,
-    'OPPONENT_MAX_INTERVAL': 2.0,
-}
-
-# Game clock
-clock = pygame.time.Clock()
-
-# Object types
-class ObjectType(Enum):
-    TREE = "tree"
-    FLAG = "flag"
-    BARRIER = "barrier"
-    PERSON = "person"
-
-def load_image(name, size, angle=0, colorkey=None):
-    """Load image with placeholder fallback."""
-    try:
-        image = pygame.image.load(name).convert_alpha()
-        image = pygame.transform.scale(image, size)
-        if colorkey is not None:
-            image.set_colorkey(colorkey)
-        return image if angle == 0 else pygame.transform.rotate(image, angle)
-    except pygame.error as e:
-        print(f"Failed to load image {name}: {e}")
-        surf = pygame.Surface(size, pygame.SRCALPHA)
-        if "tree" in name:
-            pygame.draw.rect(surf, BROWN, (size[0]//3, size[1]//2, size[0]//3, size[1]//2))
-            pygame.draw.polygon(surf, GREEN, [(0, size[1]//2), (size[0], size[1]//2), (size[0]//2, 0)])
-        elif "flag" in name:
-            pygame.draw.rect(surf, BROWN, (size[0]//2-2, 0, 4, size[1]))
-            pygame.draw.polygon(surf, RED, [(size[0]//2, 10), (size[0], 25), (size[0]//2, 40)])
-        elif "barrier" in name:
-            pygame.draw.rect(surf, YELLOW, (0, 0, size[0], size[1]))
-            pygame.draw.rect(surf, BLACK, (0, 0, size[0], size[1]), 2)
-        elif "person" in name:
-            pygame.draw.ellipse(surf, (200, 150, 150), (0, 0, size[0], size[0]))
-            pygame.draw.rect(surf, BLUE, (size[0]//4, size[0], size[0]//2, size[1]-size[0]))
-        elif "car1" in name:
-            surf.fill(BLUE)
-        else:
-            surf.fill(RED)
-        return surf if angle == 0 else pygame.transform.rotate(surf, angle)
-
-def load_sound(name):
-    """Load sound with silent fallback."""
-    try:
-        return pygame.mixer.Sound(name)
-    except pygame.error as e:
-        print(f"Failed to load sound {name}: {e}")
-        return pygame.mixer.Sound(buffer=bytearray(0))
-
-# Load assets with error handling
-try:
-    player_car_img = load_image("car.png", (CONFIG['CAR_WIDTH'], CONFIG['CAR_HEIGHT']))
-    opponent_car_img = load_image("car1.png", (CONFIG['CAR_WIDTH'], CONFIG['CAR_HEIGHT']), 180)
-    tree_img = load_image("tree.png", (CONFIG['TREE_WIDTH'], CONFIG['TREE_HEIGHT']))
-    flag_img = load_image("flag.png", (CONFIG['FLAG_WIDTH'], CONFIG['FLAG_HEIGHT']))
-    barrier_img = load_image("barrier.png", (CONFIG['BARRIER_WIDTH'], CONFIG['BARRIER_HEIGHT']))
-    person_img = load_image("person.png", (CONFIG['PERSON_WIDTH'], CONFIG['PERSON_HEIGHT']))
-except Exception as e:
-    print(f"Failed to load one or more images: {e}")
-    exit(1)
-
-# Load sounds
-engine_sound = load_sound("engine.mp3")
-crash_sound = load_sound("crash.mp3")
-score_sound = load_sound("score.mp3")
-
-# Configure audio
-engine_sound.set_volume(0.3)
-crash_sound.set_volume(0.7)
-score_sound.set_volume(0.5)
-
-class Car:
-    def __init__(self, x, y, img, max_speed, is_player=False):
-        self.x = x
-        self.y = y
-        self.img = img
-        self.max_speed = maxFuel = max_speed
-        self.speed = 0
-        self.angle = 0
-        self.target_angle = 0
-        self.is_player = is_player
-        self.width = img.get_width()
-        self.height = img.get_height()
-        self.current_img = img
-        self._image_cache = {}
-
-    def draw(self, surface):
-        angle = round(self.angle, 1)
-        if angle not in self._image_cache:
-            self._image_cache[angle] = pygame.transform.rotate(self.img, angle) if abs(angle) > 1 else self.img
-        self.current_img = self._image_cache[angle]
-        rect = self.current_img.get_rect(center=(self.x + self.width//2, self.y + self.height//2))
-        surface.blit(self.current_img, rect.topleft)
-
-    def move(self, direction=None):
-        if self.is_player:
-            if direction == "left":
-                self.target_angle = 15
-                self.x -= self.speed * CONFIG['TURN_SPEED']
-            elif direction == "right":
-                self.target_angle = -15
-                self.x += self.speed * CONFIG['TURN_SPEED']
-            else:
-                self.target_angle = 0
-
-            self.angle += (self.target_angle - self.angle) * 0.2
-            self.x = max(CONFIG['ROAD_X'] + 20, min(CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - self.width - 20, self.x))
-
-            if direction in ("left", "right"):
-                self.speed = min(self.speed + CONFIG['ACCELERATION'], self.max_speed)
-            else:
-                self.speed = max(self.speed - CONFIG['DECELERATION'], 0)
-        else:
-            self.y += self.speed
-            return self.y > HEIGHT
-
-class EnvironmentObject:
-    def __init__(self, x, y, img, obj_type):
-        self.x = x
-        self.y = y
-        self.img = img
-        self.type = obj_type
-        self.width = img.get_width()
-        self.height = img.get_height()
-
-    def draw(self, surface):
-        surface.blit(self.img, (self.x, self.y))
-
-    def get_rect(self):
-        return pygame.Rect(self.x, self.y, self.width, self.height)
-
-class Game:
-    def __init__(self):
-        self.player = Car(WIDTH // 2 - CONFIG['CAR_WIDTH'] // 2, HEIGHT - 150, player_car_img, CONFIG['MAX_SPEED'], True)
-        self.opponents = []
-        self.environment = []
-        self.score = 0
-        self.game_over = False
-        self.last_opponent_time = time.time()
-        self.opponent_interval = CONFIG['OPPONENT_MAX_INTERVAL']
-        self.start_time = time.time()
-        self.engine_sound_played = False
-        self.setup_environment()
-
-    def check_overlap(self, new_obj, existing_objs, max_retries=50):
-        """Check if new object overlaps with existing objects, with retry limit."""
-        new_rect = pygame.Rect(new_obj.x, new_obj.y, new_obj.width, new_obj.height)
-        for obj in existing_objs:
-            if new_rect.colliderect(obj.get_rect()):
-                return True
-        return False
-
-    def setup_environment(self):
-        # Place trees and flags without overlap
-        side_objects = []
-        for _ in range(8):
-            retries = 0
-            while retries < 50:
-                y = random.randint(-HEIGHT, HEIGHT * 2)
-                side = random.choice(["left", "right"])
-                x = (CONFIG['ROAD_X'] - CONFIG['TREE_WIDTH'] - random.randint(10, 50)) if side == "left" else \
-                    (CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + random.randint(10, 50))
-                tree = EnvironmentObject(x, y, tree_img, ObjectType.TREE)
-                if not self.check_overlap(tree, side_objects):
-                    side_objects.append(tree)
-                    self.environment.append(tree)
-                    break
-                retries += 1
-            if retries >= 50:
-                print("Warning: Could not place tree without overlap")
-
-        for _ in range(6):
-            retries = 0
-            while retries < 50:
-                y = random.randint(-HEIGHT, HEIGHT * 2)
-                side = random.choice(["left", "right"])
-                x = (CONFIG['ROAD_X'] - CONFIG['FLAG_WIDTH'] - random.randint(5, 30)) if side == "left" else \
-                    (CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + random.randint(5, 30))
-                flag = EnvironmentObject(x, y, flag_img, ObjectType.FLAG)
-                if not self.check_overlap(flag, side_objects):
-                    side_objects.append(flag)
-                    self.environment.append(flag)
-                    break
-                retries += 1
-            if retries >= 50:
-                print("Warning: Could not place flag without overlap")
-
-        # Place barriers (rarer)
-        for _ in range(4):
-            x = random.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['BARRIER_WIDTH'] - 20)
-            y = random.randint(-HEIGHT, HEIGHT * 2)
-            self.environment.append(EnvironmentObject(x, y, barrier_img, ObjectType.BARRIER))
-
-        # Place people
-        for _ in range(4):
-            if random.random() > 0.5:
-                x = random.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['PERSON_WIDTH'] - 20)
-                y = random.randint(-HEIGHT, HEIGHT * 2)
-                self.environment.append(EnvironmentObject(x, y, person_img, ObjectType.PERSON))
-
-    def draw_road(self):
-        screen.fill(GREEN)
-        pygame.draw.rect(screen, GRAY, (CONFIG['ROAD_X'], 0, CONFIG['ROAD_WIDTH'], HEIGHT))
-        marker_y = (self.player.speed * 10) % (CONFIG['MARKER_HEIGHT'] * 2)
-        while marker_y < HEIGHT:
-            pygame.draw.rect(screen, WHITE, (WIDTH // 2 - CONFIG['MARKER_WIDTH'] // 2, marker_y, CONFIG['MARKER_WIDTH'], CONFIG['MARKER_HEIGHT']))
-            marker_y += CONFIG['MARKER_HEIGHT'] * 2
-
-    def add_opponent(self):
-        current_time = time.time()
-        if current_time - self.last_opponent_time > self.opponent_interval:
-            x = random.randint(CONFIG['ROAD_X'] + 50, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['CAR_WIDTH'] - 50)
-            speed = random.uniform(2, 5) + self.score / 300
-            self.opponents.append(Car(x, -CONFIG['CAR_HEIGHT'], opponent_car_img, speed))
-            self.last_opponent_time = current_time
-            self.opponent_interval = max(CONFIG['OPPONENT_MIN_INTERVAL'], CONFIG['OPPONENT_MAX_INTERVAL'] - self.score / 300)
-
-    def check_collisions(self):
-        player_rect = pygame.Rect(self.player.x, self.player.y, self.player.width, self.player.height)
-
-        for opponent in self.opponents:
-            if player_rect.colliderect(pygame.Rect(opponent.x, opponent.y, opponent.width, opponent.height)):
-                self.game_over = True
-                return
-
-        for obj in self.environment:
-            if player_rect.colliderect(obj.get_rect()):
-                if obj.type == ObjectType.BARRIER:
-                    self.score += 100
-                    score_sound.play()
-                    obj.y = -HEIGHT - obj.height
-                elif obj.type == ObjectType.PERSON:
-                    crash_sound.play()
-                    self.game_over = True
-                    return
-
-    def update(self):
-        if not self.game_over:
-            if not self.engine_sound_played and time.time() - self.start_time >= 5:
-                try:
-                    engine_sound.play(-1)
-                    self.engine_sound_played = True
-                except pygame.error as e:
-                    print(f"Failed to play engine sound: {e}")
-
-            self.add_opponent()
-            self.opponents = [opponent for opponent in self.opponents if not opponent.move()]
-
-            for obj in self.environment:
-                obj.y += self.player.speed * 0.5
-                if obj.y > HEIGHT:
-                    if obj.type == ObjectType.TREE:
-                        retries = 0
-                        while retries < 50:
-                            side = random.choice(["left", "right"])
-                            x = (CONFIG['ROAD_X'] - CONFIG['TREE_WIDTH'] - random.randint(10, 50)) if side == "left" else \
-                                (CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + random.randint(10, 50))
-                            obj.x = x
-                            obj.y = -obj.height - random.randint(0, 100)
-                            if not self.check_overlap(obj, [o for o in self.environment if o.type in [ObjectType.TREE, ObjectType.FLAG]]):
-                                break
-                            retries += 1
-                        if retries >= 50:
-                            obj.y = -obj.height - random.randint(0, 100)  # Fallback placement
-                    elif obj.type == ObjectType.FLAG:
-                        retries = 0
-                        while retries < 50:
-                            side = random.choice(["left", "right"])
-                            x = (CONFIG['ROAD_X'] - CONFIG['FLAG_WIDTH'] - random.randint(5, 30)) if side == "left" else \
-                                (CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + random.randint(5, 30))
-                            obj.x = x
-                            obj.y = -obj.height - random.randint(0, 100)
-                            if not self.check_overlap(obj, [o for o in self.environment if o.type in [ObjectType.TREE, ObjectType.FLAG]]):
-                                break
-                            retries += 1
-                        if retries >= 50:
-                            obj.y = -obj.height - random.randint(0, 100)  # Fallback placement
-                    elif obj.type == ObjectType.BARRIER:
-                        obj.x = random.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['BARRIER_WIDTH'] - 20)
-                        obj.y = -obj.height - random.randint(0, 100)
-                    elif obj.type == ObjectType.PERSON:
-                        obj.x = random.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['PERSON_WIDTH'] - 20)
-                        obj.y = -obj.height - random.randint(0, 100)
-
-            self.check_collisions()
-
-    def draw(self):
-        self.draw_road()
-        for obj in self.environment:
-            obj.draw(screen)
-        for opponent in self.opponents:
-            opponent.draw(screen)
-        self.player.draw(screen)
-
-        font = pygame.font.SysFont(None, 36)
-        score_text = font.render(f"Score: {self.score}", True, WHITE)
-        screen.blit(score_text, (10, 10))
-        speed_text = font.render(f"Speed: {int(self.player.speed * 10)}", True, WHITE)
-        screen.blit(speed_text, (10, 50))
-
-        if self.game_over:
-            try:
-                engine_sound.stop()
-            except pygame.error as e:
-                print(f"Failed to stop engine sound: {e}")
-            font = pygame.font.SysFont(None, 100)
-            game_over_text = font.render("GAME OVER", True, RED)
-            screen.blit(game_over_text, (WIDTH // 2 - 150, HEIGHT // 5 - 50))
-            restart_text = font.render("R-Restart/Q-Quit", True, RED)
-            screen.blit(restart_text, (WIDTH // 2 - 220, HEIGHT // 2 + 50))
-
-def main():
-    game = Game()
-    running = True
-
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.KEYDOWN:
-                if game.game_over:
-                    if event.key == pygame.K_r:
-                        game = Game()
-                    elif event.key == pygame.K_q:
-                        running = False
-                elif event.key == pygame.K_m:
-                    try:
-                        engine_sound.set_volume(0 if engine_sound.get_volume() > 0 else 0.3)
-                    except pygame.error as e:
-                        print(f"Failed to toggle mute: {e}")
-
-        if not game.game_over:
-            keys = pygame.key.get_pressed()
-            direction = None
-            if keys[pygame.K_LEFT]:
-                direction = "left"
-            elif keys[pygame.K_RIGHT]:
-                direction = "right"
-            game.player.move(direction)
-
-        game.update()
-        game.draw()
-        pygame.display.flip()
-        clock.tick(CONFIG['FPS'])
-
-    try:
-        pygame.quit()
-    except pygame.error as e:
-        print(f"Failed to quit Pygame: {e}")
-
-if __name__ == "__main__":
-    main()
-
-    def setup_environment(self):
-        # Place trees and flags without overlap
-        side_objects = []
-        for _ in range(8):
-            retries = 0
-            while retries < 50:
-                y = random.randint(-HEIGHT, HEIGHT * 2)
-                side = random.choice(["left", "right"])
-                x = (CONFIG['ROAD_X'] - CONFIG['TREE_WIDTH'] - random.randint(10, 50)) if side == "left" else \
-                    (CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + random.randint(10, 50))
-                tree = EnvironmentObject(x, y, tree_img, ObjectType.TREE)
-                if not self.check_overlap(tree, side_objects):
-                    side_objects.append(tree)
-                    self.environment.append(tree)
-                    break
-                retries += 1
-            if retries >= 50:
-                print("Warning: Could not place tree without overlap")
-
-        for _ in range(6):
-            retries = 0
-            while retries < 50:
-                y = random.randint(-HEIGHT, HEIGHT * 2)
-                side = random.choice(["left", "right"])
-                x = (CONFIG['ROAD_X'] - CONFIG['FLAG_WIDTH'] - random.randint(5, 30)) if side == "left" else \
-                    (CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + random.randint(5, 30))
-                flag = EnvironmentObject(x, y, flag_img, ObjectType.FLAG)
-                if not self.check_overlap(flag, side_objects):
-                    side_objects.append(flag)
-                    self.environment.append(flag)
-                    break
-                retries += 1
-            if retries >= 50:
-                print("Warning: Could not place flag without overlap")
-
-        # Place barriers (rarer)
-        for _ in range(4):
-            x = random.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['BARRIER_WIDTH'] - 20)
-            y = random.randint(-HEIGHT, HEIGHT * 2)
-            self.environment.append(EnvironmentObject(x, y, barrier_img, ObjectType.BARRIER))
-
-        # Place people
-        for _ in range(4):
-            if random.random() > 0.5:
-                x = random.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['PERSON_WIDTH'] - 20)
-                y = random.randint(-HEIGHT, HEIGHT * 2)
-                self.environment.append(EnvironmentObject(x, y, person_img, ObjectType.PERSON))
-
-    def draw_road(self):
-        screen.fill(GREEN)
-        pygame.draw.rect(screen, GRAY, (CONFIG['ROAD_X'], 0, CONFIG['ROAD_WIDTH'], HEIGHT))
-        marker_y = (self.player.speed * 10) % (CONFIG['MARKER_HEIGHT'] * 2)
-        while marker_y < HEIGHT:
-            pygame.draw.rect(screen, WHITE, (WIDTH // 2 - CONFIG['MARKER_WIDTH'] // 2, marker_y, CONFIG['MARKER_WIDTH'], CONFIG['MARKER_HEIGHT']))
-            marker_y += CONFIG['MARKER_HEIGHT'] * 2
-
-    def add_opponent(self):
-        current_time = time.time()
-        if current_time - self.last_opponent_time > self.opponent_interval:
-            x = random.randint(CONFIG['ROAD_X'] + 50, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['CAR_WIDTH'] - 50)
-            speed = random.uniform(2, 5) + self.score / 300
-            self.opponents.append(Car(x, -CONFIG['CAR_HEIGHT'], opponent_car_img, speed))
-            self.last_opponent_time = current_time
-            self.opponent_interval = max(CONFIG['OPPONENT_MIN_INTERVAL'], CONFIG['OPPONENT_MAX_INTERVAL'] - self.score / 300)
-
-    def check_collisions(self):
-        player_rect = pygame.Rect(self.player.x, self.player.y, self.player.width, self.player.height)
-
-        for opponent in self.opponents:
-            if player_rect.colliderect(pygame.Rect(opponent.x, opponent.y, opponent.width, opponent.height)):
-                self.game_over = True
-                return
-
-        for obj in self.environment:
-            if player_rect.colliderect(obj.get_rect()):
-                if obj.type == ObjectType.BARRIER:
-                    self.score += 100
-                    score_sound.play()
-                    obj.y = -HEIGHT - obj.height
-                elif obj.type == ObjectType.PERSON:
-                    crash_sound.play()
-                    self.game_over = True
-                    return
-
-    def update(self):
-        if not self.game_over:
-            if not self.engine_sound_played and time.time() - self.start_time >= 5:
-                try:
-                    engine_sound.play(-1)
-                    self.engine_sound_played = True
-                except pygame.error as e:
-                    print(f"Failed to play engine sound: {e}")
-
-            self.add_opponent()
-            self.opponents = [opponent for opponent in self.opponents if not opponent.move()]
-
-            for obj in self.environment:
-                obj.y += self.player.speed * 0.5
-                if obj.y > HEIGHT:
-                    if obj.type == ObjectType.TREE:
-                        retries = 0
-                        while retries < 50:
-                            side = random.choice(["left", "right"])
-                            x = (CONFIG['ROAD_X'] - CONFIG['TREE_WIDTH'] - random.randint(10, 50)) if side == "left" else \
-                                (CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + random.randint(10, 50))
-                            obj.x = x
-                            obj.y = -obj.height - random.randint(0, 100)
-                            if not self.check_overlap(obj, [o for o in self.environment if o.type in [ObjectType.TREE, ObjectType.FLAG]]):
-                                break
-                            retries += 1
-                        if retries >= 50:
-                            obj.y = -obj.height - random.randint(0, 100)  # Fallback placement
-                    elif obj.type == ObjectType.FLAG:
-                        retries = 0
-                        while retries < 50:
-                            side = random.choice(["left", "right"])
-                            x = (CONFIG['ROAD_X'] - CONFIG['FLAG_WIDTH'] - random.randint(5, 30)) if side == "left" else \
-                                (CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + random.randint(5, 30))
-                            obj.x = x
-                            obj.y = -obj.height - random.randint(0, 100)
-                            if not self.check_overlap(obj, [o for o in self.environment if o.type in [ObjectType.TREE, ObjectType.FLAG]]):
-                                break
-                            retries += 1
-                        if retries >= 50:
-                            obj.y = -obj.height - random.randint(0, 100)  # Fallback placement
-                    elif obj.type == ObjectType.BARRIER:
-                        obj.x = random.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['BARRIER_WIDTH'] - 20)
-                        obj.y = -obj.height - random.randint(0, 100)
-                    elif obj.type == ObjectType.PERSON:
-                        obj.x = random.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['PERSON_WIDTH'] - 20)
-                        obj.y = -obj.height - random.randint(0, 100)
-
-            self.check_collisions()
-
-    def draw(self):
-        self.draw_road()
-        for obj in self.environment:
-            obj.draw(screen)
-        for opponent in self.opponents:
-            opponent.draw(screen)
-        self.player.draw(screen)
-
-        font = pygame.font.SysFont(None, 36)
-        score_text = font.render(f"Score: {self.score}", True, WHITE)
-        screen.blit(score_text, (10, 10))
-        speed_text = font.render(f"Speed: {int(self.player.speed * 10)}", True, WHITE)
-        screen.blit(speed_text, (10, 50))
-
-        if self.game_over:
-            try:
-                engine_sound.stop()
-            except pygame.error as e:
-                print(f"Failed to stop engine sound: {e}")
-            font = pygame.font.SysFont(None, 100)
-            game_over_text = font.render("GAME OVER", True, RED)
-            screen.blit(game_over_text, (WIDTH // 2 - 150, HEIGHT // 5 - 50))
-            restart_text = font.render("R-Restart/Q-Quit", True, RED)
-            screen.blit(restart_text, (WIDTH // 2 - 220, HEIGHT // 2 + 50))
-
-def main():
-    game = Game()
-    running = True
-
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.KEYDOWN:
-                if game.game_over:
-                    if event.key == pygame.K_r:
-                        game = Game()
-                    elif event.key == pygame.K_q:
-                        running = False
-                elif event.key == pygame.K_m:
-                    try:
-                        engine_sound.set_volume(0 if engine_sound.get_volume() > 0 else 0.3)
-                    except pygame.error as e:
-                        print(f"Failed to toggle mute: {e}")
-
-        if not game.game_over:
-            keys = pygame.key.get_pressed()
-            direction = None
-            if keys[pygame.K_LEFT]:
-                direction = "left"
-            elif keys[pygame.K_RIGHT]:
-                direction = "right"
-            game.player.move(direction)
-
-        game.update()
-        game.draw()
-        pygame.display.flip()
-        clock.tick(CONFIG['FPS'])
-
-    try:
-        pygame.quit()
-    except pygame.error as e:
-        print(f"Failed to quit Pygame: {e}")
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+# -*- coding: utf-8 -*-
+#Created on Tue Apr 29 2025
+
+
+# Import
+import pygame
+import random
+import time
+import os
+import math
+import hashlib
+import argparse
+import bisect
+import struct
+import csv
+import json
+import sys
+import threading
+import shlex
+import subprocess
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from enum import Enum
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Headless mode runs the simulation without a real window or mixer
+HEADLESS = os.environ.get("SIMPLE_GAME_HEADLESS") == "1"
+if HEADLESS:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+# Game window setup (the window itself is opened by init_display)
+WIDTH = 800
+HEIGHT = 600
+screen = None
+
+# Colors
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GREEN = (70, 248, 160)
+GRAY = (210, 210, 210)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+YELLOW = (255, 255, 0)
+BROWN = (139, 69, 19)
+
+# Configuration constants
+CONFIG = {
+    'ROAD_WIDTH': 350,
+    'ROAD_X': (WIDTH - 350) // 2,
+    'MARKER_WIDTH': 10,
+    'MARKER_HEIGHT': 50,
+    'CAR_WIDTH': 40,
+    'CAR_HEIGHT': 100,
+    'MAX_SPEED': 15,
+    'ACCELERATION': 0.20,
+    'DECELERATION': 0.05,
+    'TURN_SPEED': 0.3,
+    'TREE_WIDTH': 80,
+    'TREE_HEIGHT': 80,
+    'FLAG_WIDTH': 40,
+    'FLAG_HEIGHT': 80,
+    'BARRIER_WIDTH': 80,
+    'BARRIER_HEIGHT': 50,
+    'PERSON_WIDTH': 30,
+    'PERSON_HEIGHT': 90,
+    'FPS': 60,
+    'OPPONENT_MIN_INTERVAL': 1,
+    'OPPONENT_MAX_INTERVAL': 2.0,
+    'GRID_CELL_SIZE': 100,
+    'ENTITY_BACKEND': os.environ.get("SIMPLE_GAME_BACKEND", "python"),
+    'RENDER_MODE': "full",
+    'DIRTY_FULL_RATIO': 0.5,
+    'ROTATION_STEP': 0.5,
+    'ROTATION_CACHE_BYTES': 8 * 1024 * 1024,
+    'PIXEL_COLLISIONS': True,
+    'CAPTURE_FPS': 30,
+    'CAPTURE_SLOTS': 16,
+    'CAPTURE_PNG_LEVEL': 1,
+    'PROFILE_WINDOW': 600,
+    'OPPONENT_POOL_SIZE': 32,
+    'RENDER_FPS': 60,
+    'MAX_TICKS_PER_FRAME': 5,
+    'INPUT_POLL_INTERVAL': 0.001,
+    'TRACK_MODE': "loop",
+    'CHUNK_HEIGHT': 600,
+    'CHUNK_TREES': 3,
+    'CHUNK_FLAGS': 2,
+    'CHUNK_BARRIERS': 1,
+    'CHUNK_PEOPLE': 1,
+}
+
+# On-disk cache of scaled/rotated sprite pixels; bump the version to invalidate it
+ASSET_CACHE_DIR = os.environ.get("SIMPLE_GAME_ASSET_CACHE", ".asset_cache")
+ASSET_CACHE_VERSION = 1
+
+# Sprite name -> (file, CONFIG size prefix, rotation)
+IMAGE_SPECS = {
+    'player_car': ("car.png", 'CAR', 0),
+    'opponent_car': ("car1.png", 'CAR', 180),
+    'tree': ("tree.png", 'TREE', 0),
+    'flag': ("flag.png", 'FLAG', 0),
+    'barrier': ("barrier.png", 'BARRIER', 0),
+    'person': ("person.png", 'PERSON', 0),
+}
+
+# Sound name -> (file, volume, channel group)
+SOUND_SPECS = {
+    'engine': ("engine.mp3", 0.3, 'engine'),
+    'crash': ("crash.mp3", 0.7, 'sfx'),
+    'score': ("score.mp3", 0.5, 'sfx'),
+}
+
+def init_display():
+    """Initialize pygame and the mixer and open the game window."""
+    global screen
+    try:
+        if HEADLESS:
+            pygame.display.init()
+        else:
+            pygame.init()
+            pygame.mixer.init()
+    except pygame.error as e:
+        print(f"Pygame initialization failed: {e}")
+        exit(1)
+    try:
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Simple Game")
+    except pygame.error as e:
+        print(f"Failed to set up display: {e}")
+        exit(1)
+    return screen
+
+# Object types
+class ObjectType(Enum):
+    TREE = "tree"
+    FLAG = "flag"
+    BARRIER = "barrier"
+    PERSON = "person"
+
+def load_image(name, size, angle=0, colorkey=None):
+    """Load image with placeholder fallback."""
+    try:
+        image = pygame.image.load(name)
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        image = pygame.transform.scale(image, size)
+        if colorkey is not None:
+            image.set_colorkey(colorkey)
+        return image if angle == 0 else pygame.transform.rotate(image, angle)
+    except (pygame.error, OSError) as e:
+        print(f"Failed to load image {name}: {e}")
+        surf = pygame.Surface(size, pygame.SRCALPHA)
+        if "tree" in name:
+            pygame.draw.rect(surf, BROWN, (size[0]//3, size[1]//2, size[0]//3, size[1]//2))
+            pygame.draw.polygon(surf, GREEN, [(0, size[1]//2), (size[0], size[1]//2), (size[0]//2, 0)])
+        elif "flag" in name:
+            pygame.draw.rect(surf, BROWN, (size[0]//2-2, 0, 4, size[1]))
+            pygame.draw.polygon(surf, RED, [(size[0]//2, 10), (size[0], 25), (size[0]//2, 40)])
+        elif "barrier" in name:
+            pygame.draw.rect(surf, YELLOW, (0, 0, size[0], size[1]))
+            pygame.draw.rect(surf, BLACK, (0, 0, size[0], size[1]), 2)
+        elif "person" in name:
+            pygame.draw.ellipse(surf, (200, 150, 150), (0, 0, size[0], size[0]))
+            pygame.draw.rect(surf, BLUE, (size[0]//4, size[0], size[0]//2, size[1]-size[0]))
+        elif "car1" in name:
+            surf.fill(BLUE)
+        else:
+            surf.fill(RED)
+        return surf if angle == 0 else pygame.transform.rotate(surf, angle)
+
+class SilentSound:
+    """Stand-in for pygame.mixer.Sound when no mixer is available."""
+    def __init__(self):
+        self.volume = 0
+
+    def play(self, loops=0):
+        pass
+
+    def stop(self):
+        pass
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def get_volume(self):
+        return self.volume
+
+def load_sound(name):
+    """Load sound with silent fallback."""
+    if HEADLESS or not pygame.mixer.get_init():
+        return SilentSound()
+    try:
+        return pygame.mixer.Sound(name)
+    except (pygame.error, OSError) as e:
+        print(f"Failed to load sound {name}: {e}")
+        return pygame.mixer.Sound(buffer=bytearray(0))
+
+class AudioManager:
+    """Queues sound events from the game and plays them once per frame.
+
+    start() decodes every sound on a background thread, so a frame never
+    waits on MP3 decoding. The engine, sound effects and UI each get
+    reserved mixer channels, so a burst of effects never cuts off the
+    engine loop. Until start() succeeds (headless runs, servers, no audio
+    device) the manager is disabled and posting events does nothing. Events
+    may be posted from any thread; the queue swap in drain() is locked.
+    """
+    # Channel group -> reserved channel count, numbered from channel 0 in this order
+    CHANNEL_GROUPS = (('engine', 1), ('sfx', 2), ('ui', 1))
+
+    def __init__(self):
+        self.enabled = False
+        self.sounds = {}
+        self.channels = {}
+        self.events = deque()
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.muted = set()
+        self.loader = None
+
+    def start(self):
+        if HEADLESS or not pygame.mixer.get_init():
+            return False
+        first = 0
+        for group, count in self.CHANNEL_GROUPS:
+            self.channels[group] = [pygame.mixer.Channel(first + i) for i in range(count)]
+            first += count
+        pygame.mixer.set_reserved(first)
+        self.loader = threading.Thread(target=self._decode, name="audio-decode", daemon=True)
+        self.loader.start()
+        self.enabled = True
+        return True
+
+    def _decode(self):
+        for name, (filename, _, _) in SOUND_SPECS.items():
+            self.sounds[name] = load_sound(filename)
+
+    def play(self, name, loops=0, at=None):
+        """Queue a sound; with at, it waits until the time passed to drain() reaches it."""
+        if self.enabled:
+            with self.lock:
+                self.events.append(('play', name, loops, at))
+
+    def stop(self, name):
+        """Queue a stop; it also cancels plays of the sound still waiting in the queue."""
+        if self.enabled:
+            with self.lock:
+                self.events.append(('stop', name, 0, None))
+
+    def toggle_mute(self, name):
+        if self.enabled:
+            with self.lock:
+                self.events.append(('mute', name, 0, None))
+
+    def drain(self, now):
+        """Handle the queued events. Call once per frame on the main thread."""
+        if not self.enabled:
+            return
+        with self.lock:
+            events, self.events = self.events, self.pending
+        for event in events:
+            kind, name, loops, at = event
+            if kind == 'play':
+                if (at is not None and at > now) or not self._play(name, loops):
+                    with self.lock:
+                        self.events.append(event)
+            elif kind == 'stop':
+                with self.lock:
+                    if self.events:
+                        self.events = deque(e for e in self.events if e[1] != name)
+                sound = self.sounds.get(name)
+                if sound is not None:
+                    sound.stop()
+            elif kind == 'mute':
+                if name in self.muted:
+                    self.muted.discard(name)
+                else:
+                    self.muted.add(name)
+                sound = self.sounds.get(name)
+                if sound is not None:
+                    sound.set_volume(self._volume(name))
+        events.clear()
+        self.pending = events
+
+    def _volume(self, name):
+        return 0 if name in self.muted else SOUND_SPECS[name][1]
+
+    def _play(self, name, loops):
+        """Play a decoded sound on its group's channels; False means retry next frame."""
+        sound = self.sounds.get(name)
+        if sound is None:
+            # Still decoding: keep loops queued, drop one-shots rather than play them late
+            return loops != -1
+        if not sound.get_length():
+            # A missing file loads as an empty sound, which SDL_mixer crashes on when played on a channel
+            return True
+        channels = self.channels[SOUND_SPECS[name][2]]
+        channel = channels[0]
+        for candidate in channels:
+            if not candidate.get_busy():
+                channel = candidate
+                break
+        sound.set_volume(self._volume(name))
+        try:
+            channel.play(sound, loops)
+        except pygame.error as e:
+            print(f"Failed to play {name} sound: {e}")
+        return True
+
+audio = AudioManager()
+# Headless games post into a manager that is never started, so they stay silent
+NO_AUDIO = AudioManager()
+
+class AssetManager:
+    """Loads sprites on first use.
+
+    Scaled and rotated sprite pixels are kept in a versioned on-disk cache keyed
+    by the source file hash and target size, so warm starts skip decoding and
+    transforms.
+    """
+    HEADER = struct.Struct("<4sIII")
+    MAGIC = b"SGAC"
+
+    def __init__(self, cache_dir=ASSET_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.images = {}
+
+    def image(self, name):
+        image = self.images.get(name)
+        if image is None:
+            filename, prefix, angle = IMAGE_SPECS[name]
+            size = (CONFIG[prefix + '_WIDTH'], CONFIG[prefix + '_HEIGHT'])
+            image = self.images[name] = self._load_image(filename, size, angle)
+        return image
+
+    def _cache_path(self, filename, size, angle):
+        try:
+            with open(filename, "rb") as f:
+                file_hash = hashlib.sha1(f.read()).hexdigest()
+        except OSError:
+            return None
+        key = f"{ASSET_CACHE_VERSION}:{file_hash}:{size[0]}x{size[1]}:{angle}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".bin")
+
+    def _load_image(self, filename, size, angle):
+        path = self._cache_path(filename, size, angle)
+        if path is None:
+            # Missing source file: load_image draws a placeholder, nothing to cache
+            return load_image(filename, size, angle)
+        image = self._read_cache(path)
+        if image is None:
+            image = load_image(filename, size, angle)
+            self._write_cache(path, image)
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        return image
+
+    def _read_cache(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < self.HEADER.size:
+            return None
+        magic, version, width, height = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != ASSET_CACHE_VERSION or \
+                len(data) != self.HEADER.size + width * height * 4:
+            return None
+        return pygame.image.frombuffer(data[self.HEADER.size:], (width, height), "RGBA")
+
+    def _write_cache(self, path, image):
+        width, height = image.get_size()
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, ASSET_CACHE_VERSION, width, height))
+                f.write(pygame.image.tostring(image, "RGBA"))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write asset cache {path}: {e}")
+
+assets = AssetManager()
+
+class SimClock:
+    """Manually advanced time source for headless, fixed-timestep runs."""
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, dt):
+        self.now += dt
+
+class RotationAtlas:
+    """Rotated sprites shared by every Car, keyed by (image, quantized angle).
+
+    Angles snap to multiples of step degrees, entries are evicted least
+    recently used first once their pixels exceed max_bytes, and hits and
+    misses are counted so the cache can be sized. Lookups are locked, since
+    a threaded simulation rotates the player for collisions while the
+    render loop draws.
+    """
+    def __init__(self, step=None, max_bytes=None):
+        self.step = step or CONFIG['ROTATION_STEP']
+        self.max_bytes = max_bytes or CONFIG['ROTATION_CACHE_BYTES']
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, img, angle):
+        index = round(angle / self.step)
+        if abs(index * self.step) <= 1:
+            return img
+        key = (id(img), index)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry[1]
+            self.misses += 1
+            return self._add(key, img, index)
+
+    def _add(self, key, img, index):
+        rotated = pygame.transform.rotate(img, index * self.step)
+        # The source image is kept in the entry so its id cannot be reused
+        self.entries[key] = (img, rotated)
+        self.bytes += rotated.get_width() * rotated.get_height() * rotated.get_bytesize()
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, old) = self.entries.popitem(last=False)
+            self.bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+        return rotated
+
+    def warm(self, img, low=-15, high=15):
+        """Pre-render every quantized angle in [low, high] degrees."""
+        for index in range(math.ceil(low / self.step), math.floor(high / self.step) + 1):
+            key = (id(img), index)
+            with self.lock:
+                if abs(index * self.step) > 1 and key not in self.entries:
+                    self._add(key, img, index)
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses}
+
+rotations = RotationAtlas()
+
+class MaskAtlas:
+    """Collision masks shared by every sprite, keyed by (image, quantized angle).
+
+    Masks are built from the same rotated surfaces RotationAtlas draws, so
+    a collision means opaque pixels touch on screen. There are only a few
+    sprites and steering angles, so entries are never evicted.
+    """
+    def __init__(self, atlas):
+        self.atlas = atlas
+        self.entries = {}
+
+    def get(self, img, angle=0):
+        index = round(angle / self.atlas.step)
+        if abs(index * self.atlas.step) <= 1:
+            # RotationAtlas draws these angles unrotated
+            index = 0
+        key = (id(img), index)
+        entry = self.entries.get(key)
+        if entry is None:
+            # The source image is kept in the entry so its id cannot be reused
+            entry = self.entries[key] = (img, pygame.mask.from_surface(self.atlas.get(img, angle)))
+        return entry[1]
+
+masks = MaskAtlas(rotations)
+
+class Car:
+    __slots__ = ('x', 'y', 'img', 'max_speed', 'speed', 'angle', 'target_angle', 'is_player',
+                 'width', 'height', 'current_img', 'pool_slot', 'prev_x', 'prev_angle')
+
+    def __init__(self, x, y, img, max_speed, is_player=False):
+        self.x = x
+        self.y = y
+        self.img = img
+        self.max_speed = maxFuel = max_speed
+        self.speed = 0 if is_player else max_speed
+        self.angle = 0
+        self.target_angle = 0
+        self.is_player = is_player
+        self.width = img.get_width()
+        self.height = img.get_height()
+        self.current_img = img
+        self.pool_slot = None
+        # State before the last physics tick, for interpolated drawing
+        self.prev_x = x
+        self.prev_angle = 0
+
+    def sprite(self, back=0.0):
+        """The rotated image and its top-left, centred on the car's box.
+
+        back in [0, 1] places the car that fraction of a tick behind its
+        current state, back towards the previous physics tick.
+        """
+        x, y, angle = self.x, self.y, self.angle
+        if back:
+            if self.is_player:
+                x -= (x - self.prev_x) * back
+                angle -= (angle - self.prev_angle) * back
+            else:
+                y -= self.speed * back
+        img = self.current_img = rotations.get(self.img, angle)
+        # Rounded like Rect's center setter, without building a Rect every frame
+        return img, (math.floor(x + self.width // 2 + 0.5) - img.get_width() // 2,
+                     math.floor(y + self.height // 2 + 0.5) - img.get_height() // 2)
+
+    def draw(self, surface):
+        img, position = self.sprite()
+        return surface.blit(img, position)
+
+    def move(self, direction=None):
+        if self.is_player:
+            if direction == "left":
+                self.target_angle = 15
+                self.x -= self.speed * CONFIG['TURN_SPEED']
+            elif direction == "right":
+                self.target_angle = -15
+                self.x += self.speed * CONFIG['TURN_SPEED']
+            else:
+                self.target_angle = 0
+
+            self.angle += (self.target_angle - self.angle) * 0.2
+            self.x = max(CONFIG['ROAD_X'] + 20, min(CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - self.width - 20, self.x))
+
+            if direction in ("left", "right"):
+                self.speed = min(self.speed + CONFIG['ACCELERATION'], self.max_speed)
+            else:
+                self.speed = max(self.speed - CONFIG['DECELERATION'], 0)
+        else:
+            self.y += self.speed
+            return self.y > HEIGHT
+
+class SpatialHash:
+    """Uniform grid that buckets objects by the cells their rect touches.
+
+    Objects need x, y, width and height, and keep their size once
+    inserted. update() only rebuckets an object when it crosses a cell
+    boundary, and query() looks at the cells under the given rect instead
+    of every registered object. Cells and per-object bounds lists are kept
+    and reused, so steady-state movement allocates nothing that outlives
+    the call.
+    """
+    def __init__(self, cell_size=None):
+        self.cell_size = cell_size or CONFIG['GRID_CELL_SIZE']
+        self.cells = {}
+        self.bounds = {}
+        self.spare_bounds = []
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def _add(self, obj, x0, y0, x1, y1):
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cells[(cx, cy)] = {obj}
+                else:
+                    cell.add(obj)
+
+    def _discard(self, obj, x0, y0, x1, y1):
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cells[(cx, cy)].discard(obj)
+
+    def _locate(self, obj, bounds):
+        """Fill bounds with obj's cell range, its x, and the y range that keeps those cells."""
+        size = self.cell_size
+        x = obj.x
+        y = obj.y
+        height = obj.height
+        bounds[0] = int(x // size)
+        bounds[1] = y0 = int(y // size)
+        bounds[2] = int((x + obj.width) // size)
+        bounds[3] = y1 = int((y + height) // size)
+        bounds[4] = x
+        bounds[5] = max(y0 * size, y1 * size - height)
+        bounds[6] = min((y0 + 1) * size, (y1 + 1) * size - height)
+
+    def insert(self, obj):
+        bounds = self.spare_bounds.pop() if self.spare_bounds else [0, 0, 0, 0, 0.0, 0.0, 0.0]
+        self._locate(obj, bounds)
+        self.bounds[obj] = bounds
+        self._add(obj, bounds[0], bounds[1], bounds[2], bounds[3])
+
+    def remove(self, obj):
+        bounds = self.bounds.pop(obj, None)
+        if bounds is not None:
+            self._discard(obj, bounds[0], bounds[1], bounds[2], bounds[3])
+            self.spare_bounds.append(bounds)
+
+    def update(self, obj):
+        bounds = self.bounds.get(obj)
+        if bounds is None:
+            self.insert(obj)
+            return
+        # Scrolling only moves objects down, so most updates stay inside the rows they already cover
+        if obj.x == bounds[4] and bounds[5] <= obj.y < bounds[6]:
+            return
+        x0, y0, x1, y1 = bounds[0], bounds[1], bounds[2], bounds[3]
+        self._locate(obj, bounds)
+        if bounds[0] != x0 or bounds[1] != y0 or bounds[2] != x1 or bounds[3] != y1:
+            self._discard(obj, x0, y0, x1, y1)
+            self._add(obj, bounds[0], bounds[1], bounds[2], bounds[3])
+
+    def query(self, x, y, width, height, exclude=None):
+        """Return registered objects whose rect overlaps the given rect."""
+        cells = self.cells
+        size = self.cell_size
+        found = []
+        seen = set()
+        right = x + width
+        bottom = y + height
+        for cx in range(int(x // size), int(right // size) + 1):
+            for cy in range(int(y // size), int(bottom // size) + 1):
+                cell = cells.get((cx, cy))
+                if not cell:
+                    continue
+                for obj in cell:
+                    if obj is exclude or obj in seen:
+                        continue
+                    seen.add(obj)
+                    if obj.x < right and x < obj.x + obj.width and obj.y < bottom and y < obj.y + obj.height:
+                        found.append(obj)
+        return found
+
+class EnvironmentObject:
+    def __init__(self, x, y, img, obj_type):
+        self.x = x
+        self.y = y
+        self.img = img
+        self.type = obj_type
+        self.width = img.get_width()
+        self.height = img.get_height()
+        # Roadside lane and track start reserved for it by RoadsideLanes, if any
+        self.lane = None
+        self.lane_start = 0.0
+
+    def draw(self, surface):
+        return surface.blit(self.img, (self.x, self.y))
+
+    def get_rect(self):
+        return pygame.Rect(self.x, self.y, self.width, self.height)
+
+class StoreField:
+    """Attribute of a view that lives in an EntityStore column once attached."""
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, view, owner=None):
+        if view is None:
+            return self
+        if view.slot is None:
+            return view.__dict__[self.name]
+        return getattr(view.store, self.name)[view.slot]
+
+    def __set__(self, view, value):
+        if view.slot is None:
+            view.__dict__[self.name] = value
+        else:
+            getattr(view.store, self.name)[view.slot] = value
+
+class StoredCar(Car):
+    """Opponent car whose position and speed are a row of an EntityStore."""
+    store = None
+    slot = None
+    x = StoreField('x')
+    y = StoreField('y')
+    speed = StoreField('speed')
+    width = StoreField('width')
+    height = StoreField('height')
+
+class StoredEnvironmentObject(EnvironmentObject):
+    """Environment object whose position is a row of an EntityStore."""
+    store = None
+    slot = None
+    x = StoreField('x')
+    y = StoreField('y')
+    width = StoreField('width')
+    height = StoreField('height')
+
+class EntityStore:
+    """Structure-of-arrays backend for opponents and environment objects.
+
+    Keeps x, y, speed, width and height in NumPy arrays so scrolling,
+    off-screen detection and AABB queries are single batched operations.
+    It has the same insert/remove/update/query interface as SpatialHash;
+    update() is a no-op because positions already live in the arrays.
+    """
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.views = []
+        self.free = []
+        self.count = 0
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, capacity):
+        old = self.capacity
+        for name, dtype in (('x', np.float64), ('y', np.float64), ('speed', np.float64),
+                            ('scroll', np.float64), ('width', np.float64), ('height', np.float64),
+                            ('active', np.bool_)):
+            column = np.zeros(capacity, dtype=dtype)
+            if old:
+                column[:old] = getattr(self, name)
+            setattr(self, name, column)
+        self.views.extend([None] * (capacity - old))
+        self.free.extend(range(capacity - 1, old - 1, -1))
+        self.capacity = capacity
+
+    def insert(self, view, slot=None):
+        if slot is None:
+            if not self.free:
+                self._grow(self.capacity * 2)
+            slot = self.free.pop()
+        else:
+            # Restoring a saved layout; the caller resets the free list afterwards
+            while slot >= self.capacity:
+                self._grow(self.capacity * 2)
+        values = view.__dict__
+        self.x[slot] = values.pop('x')
+        self.y[slot] = values.pop('y')
+        self.speed[slot] = values.pop('speed', 0)
+        self.width[slot] = values.pop('width')
+        self.height[slot] = values.pop('height')
+        # Opponents move by their own speed only; scenery moves with the road
+        self.scroll[slot] = 0 if isinstance(view, Car) else 1
+        self.active[slot] = True
+        self.views[slot] = view
+        view.store = self
+        view.slot = slot
+        self.count += 1
+
+    def remove(self, view):
+        slot = view.slot
+        if slot is None:
+            return
+        # Hand the row back to the view so it keeps working once detached
+        values = view.__dict__
+        values['x'] = float(self.x[slot])
+        values['y'] = float(self.y[slot])
+        values['width'] = int(self.width[slot])
+        values['height'] = int(self.height[slot])
+        if isinstance(view, Car):
+            values['speed'] = float(self.speed[slot])
+        view.slot = None
+        self.active[slot] = False
+        self.views[slot] = None
+        self.free.append(slot)
+        self.count -= 1
+
+    def update(self, view):
+        pass
+
+    def advance(self, scroll_speed):
+        """Move every row by its own speed plus its share of the scroll speed."""
+        self.y += self.speed + self.scroll * scroll_speed
+
+    def below(self, limit):
+        """Return the views of active rows whose top edge is past limit."""
+        views = self.views
+        return [views[i] for i in np.flatnonzero(self.active & (self.y > limit))]
+
+    def query(self, x, y, width, height, exclude=None):
+        """Return views whose rect overlaps the given rect."""
+        mask = self.active & (self.x < x + width) & (self.x + self.width > x) & \
+            (self.y < y + height) & (self.y + self.height > y)
+        if exclude is not None and exclude.slot is not None:
+            mask[exclude.slot] = False
+        views = self.views
+        return [views[i] for i in np.flatnonzero(mask)]
+
+class HUD:
+    """Score, speed and game-over text with cached fonts and rendered strings.
+
+    Fonts are created once per size and text surfaces are memoized by
+    (string, color, size) with LRU eviction, so a frame only rasterizes
+    text whose value actually changed.
+    """
+    def __init__(self, max_texts=64):
+        self.fonts = {}
+        self.texts = OrderedDict()
+        self.max_texts = max_texts
+        self.score = None
+        self.speed = None
+        self.score_text = None
+        self.speed_text = None
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = self.fonts[size] = pygame.font.SysFont(None, size)
+        return font
+
+    def text(self, string, color, size):
+        key = (string, color, size)
+        surf = self.texts.get(key)
+        if surf is None:
+            surf = self.texts[key] = self.font(size).render(string, True, color)
+            if len(self.texts) > self.max_texts:
+                self.texts.popitem(last=False)
+        else:
+            self.texts.move_to_end(key)
+        return surf
+
+    def enqueue(self, queue, game):
+        """Queue the HUD text on the hud layer."""
+        if game.score != self.score:
+            self.score = game.score
+            self.score_text = self.text(f"Score: {self.score}", WHITE, 36)
+        speed = int(game.player.speed * 10)
+        if speed != self.speed:
+            self.speed = speed
+            self.speed_text = self.text(f"Speed: {speed}", WHITE, 36)
+        queue.add('hud', self.score_text, (10, 10))
+        queue.add('hud', self.speed_text, (10, 50))
+
+        if game.game_over:
+            queue.add('hud', self.text("GAME OVER", RED, 100), (WIDTH // 2 - 150, HEIGHT // 5 - 50))
+            queue.add('hud', self.text("R-Restart/Q-Quit", RED, 100), (WIDTH // 2 - 220, HEIGHT // 2 + 50))
+
+hud = HUD()
+
+class RoadLayer:
+    """Verge, road and lane markers pre-rendered once into a tall tiled surface.
+
+    The surface is one marker period taller than the screen, so any scroll
+    offset is a single blit of a window into it.
+    """
+    def __init__(self):
+        self.surface = None
+        self.period = CONFIG['MARKER_HEIGHT'] * 2
+
+    def build(self):
+        self.period = CONFIG['MARKER_HEIGHT'] * 2
+        layer = pygame.Surface((WIDTH, HEIGHT + self.period))
+        if pygame.display.get_surface() is not None:
+            layer = layer.convert()
+        layer.fill(GREEN)
+        pygame.draw.rect(layer, GRAY, (CONFIG['ROAD_X'], 0, CONFIG['ROAD_WIDTH'], layer.get_height()))
+        for marker_y in range(0, layer.get_height(), self.period):
+            pygame.draw.rect(layer, WHITE, (WIDTH // 2 - CONFIG['MARKER_WIDTH'] // 2, marker_y, CONFIG['MARKER_WIDTH'], CONFIG['MARKER_HEIGHT']))
+        self.surface = layer
+
+    def marker_rect(self):
+        """Screen strip covered by the lane markers."""
+        return pygame.Rect(WIDTH // 2 - CONFIG['MARKER_WIDTH'] // 2, 0, CONFIG['MARKER_WIDTH'], HEIGHT)
+
+    def enqueue(self, queue, offset, rects=None):
+        """Queue the road scrolled by offset on the background layer, either whole or only inside rects."""
+        if self.surface is None:
+            self.build()
+        top = self.period - int(offset) % self.period
+        if rects is None:
+            queue.add('background', self.surface, (0, 0), (0, top, WIDTH, HEIGHT))
+        else:
+            for rect in rects:
+                queue.add('background', self.surface, rect.topleft, (rect.x, rect.y + top, rect.width, rect.height))
+
+road = RoadLayer()
+
+class RenderQueue:
+    """Blit lists per draw layer, each submitted with a single Surface.blits() call.
+
+    Sprites entirely outside the screen are culled when queued, so objects
+    waiting in the spawn area above the screen never reach a blit.
+    """
+    LAYERS = ('background', 'scenery', 'traffic', 'player', 'hud')
+
+    def __init__(self):
+        self.layers = {layer: [] for layer in self.LAYERS}
+
+    def add(self, layer, image, position, area=None):
+        self.layers[layer].append((image, position) if area is None else (image, position, area))
+
+    def add_objects(self, layer, objects, dy=0.0):
+        """Queue every on-screen object's img at its (x, y + dy)."""
+        blits = self.layers[layer]
+        for obj in objects:
+            x = obj.x
+            y = obj.y + dy
+            if y < HEIGHT and y + obj.height > 0 and x < WIDTH and x + obj.width > 0:
+                blits.append((obj.img, (x, y)))
+
+    def add_cars(self, layer, cars, back=0.0):
+        """Queue every on-screen car's rotated sprite, drawn back of a tick behind."""
+        blits = self.layers[layer]
+        for car in cars:
+            img, position = car.sprite(back)
+            x, y = position
+            if y < HEIGHT and y + img.get_height() > 0 and x < WIDTH and x + img.get_width() > 0:
+                blits.append((img, position))
+
+    def submit(self, surface, layer, doreturn=True):
+        """Blit and clear one layer; returns the covered rects when doreturn is set."""
+        blits = self.layers[layer]
+        rects = surface.blits(blits, doreturn)
+        blits.clear()
+        return rects
+
+render_queue = RenderQueue()
+
+class DirtyRenderer:
+    """Redraws and uploads only the screen regions that changed since the last frame.
+
+    The road is restored under every sprite's previous rect (and under the
+    lane markers when they scrolled), sprites are drawn on top, and the union
+    of previous and current rects goes to pygame.display.update(). When the
+    dirty area exceeds full_ratio of the screen a plain flip is cheaper.
+    """
+    def __init__(self, full_ratio=None):
+        self.full_ratio = CONFIG['DIRTY_FULL_RATIO'] if full_ratio is None else full_ratio
+        self.previous = None
+        self.offset = None
+        self.full_frames = 0
+        self.partial_frames = 0
+
+    def reset(self):
+        """Force the next frame to be a full redraw."""
+        self.previous = None
+
+    def render(self, game, surface=None, alpha=1.0):
+        surface = surface or screen
+        offset = game.road_offset()
+        if self.previous is None:
+            with game.profiler.section('draw'):
+                drawn = game.draw(surface, alpha=alpha)
+            dirty = None
+        else:
+            restore = self.previous
+            if offset != self.offset:
+                restore = restore + [road.marker_rect()]
+            with game.profiler.section('draw'):
+                drawn = game.draw(surface, restore, alpha)
+            dirty = restore + drawn
+            area = sum(rect.width * rect.height for rect in dirty)
+            if area > self.full_ratio * WIDTH * HEIGHT:
+                dirty = None
+
+        with game.profiler.section('flip'):
+            if dirty is None:
+                pygame.display.flip()
+                self.full_frames += 1
+            else:
+                pygame.display.update(dirty)
+                self.partial_frames += 1
+        self.previous = [rect for rect in drawn if rect.width and rect.height]
+        self.offset = offset
+
+class ProfileSection:
+    """Context manager that adds its elapsed time to one profiler phase."""
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+class Profiler:
+    """Per-phase frame timings with rolling percentiles, an overlay and trace export.
+
+    Phases are timed with `with profiler.section(name):`. Every frame's
+    timings are kept for export, and the last `window` samples of each phase
+    feed the p50/p95/p99 stats shown in the overlay.
+    """
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window=None):
+        self.window = window or CONFIG['PROFILE_WINDOW']
+        self.samples = {}
+        self.sections = {}
+        self.frame = {}
+        self.frames = []
+        self.overlay = False
+        self.fps = 0
+        self.lines = []
+        self.lines_time = 0
+
+    def section(self, name):
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = ProfileSection(self, name)
+        return section
+
+    def record(self, name, seconds):
+        ms = seconds * 1000
+        self.frame[name] = self.frame.get(name, 0) + ms
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(ms)
+
+    def end_frame(self, fps=0):
+        self.fps = fps
+        self.frames.append(self.frame)
+        self.frame = {}
+
+    def stats(self):
+        """Rolling percentiles in milliseconds for every phase."""
+        stats = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            stats[name] = {f"p{p}": ordered[min(len(ordered) - 1, len(ordered) * p // 100)] for p in self.PERCENTILES}
+        return stats
+
+    def draw(self, surface):
+        """Draw the overlay when it is toggled on and return the rects it covered."""
+        if not self.overlay:
+            return []
+        # Stats are re-sorted and re-rendered twice a second, not every frame
+        now = time.perf_counter()
+        if now - self.lines_time > 0.5:
+            self.lines_time = now
+            self.lines = [(f"FPS {self.fps:.1f}", "p50", "p95", "p99")]
+            for name, values in self.stats().items():
+                self.lines.append((name, f"{values['p50']:.2f}", f"{values['p95']:.2f}", f"{values['p99']:.2f}"))
+        panel = pygame.Rect(WIDTH - 290, 5, 285, 10 + len(self.lines) * 18)
+        surface.fill(BLACK, panel)
+        for row, cells in enumerate(self.lines):
+            y = panel.y + 5 + row * 18
+            surface.blit(hud.text(cells[0], YELLOW, 22), (panel.x + 5, y))
+            for column, cell in enumerate(cells[1:]):
+                text = hud.text(cell, YELLOW, 22)
+                surface.blit(text, (panel.x + 160 + column * 40 - text.get_width() + 30, y))
+        return [panel]
+
+    def export(self, path):
+        """Write the per-frame trace as CSV, or as JSON with summary stats when path ends in .json."""
+        names = sorted({name for frame in self.frames for name in frame})
+        try:
+            with open(path, "w", newline="") as f:
+                if path.endswith(".json"):
+                    json.dump({'phases': names, 'summary': self.stats(), 'frames': self.frames}, f)
+                else:
+                    writer = csv.writer(f)
+                    writer.writerow(["frame"] + names)
+                    for i, frame in enumerate(self.frames):
+                        writer.writerow([i] + [f"{frame.get(name, 0):.4f}" for name in names])
+        except OSError as e:
+            print(f"Failed to write profile {path}: {e}")
+
+class NullProfiler:
+    """Profiler stand-in with no timing overhead, used when profiling is off."""
+    overlay = False
+
+    def __init__(self):
+        self.context = nullcontext()
+
+    def section(self, name):
+        return self.context
+
+    def end_frame(self, fps=0):
+        pass
+
+    def draw(self, surface):
+        return []
+
+NULL_PROFILER = NullProfiler()
+
+class OpponentPool:
+    """Fixed set of opponent cars that are activated and deactivated in place.
+
+    The active cars are always cars[:count]. Releasing a car swaps the last
+    active car into its place, so spawning and despawning never allocate.
+    """
+    def __init__(self, car_class, img, capacity=None):
+        capacity = capacity or CONFIG['OPPONENT_POOL_SIZE']
+        self.cars = [car_class(0, -img.get_height(), img, 0) for _ in range(capacity)]
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.cars[:self.count])
+
+    def acquire(self, x, y, speed):
+        """Activate a car at the given position, or return None when the pool is full."""
+        if self.count == len(self.cars):
+            return None
+        car = self.cars[self.count]
+        car.x = x
+        car.y = y
+        car.speed = car.max_speed = speed
+        car.pool_slot = self.count
+        self.count += 1
+        return car
+
+    def release(self, car):
+        cars = self.cars
+        slot = car.pool_slot
+        last = self.count - 1
+        moved = cars[last]
+        cars[slot], cars[last] = moved, car
+        moved.pool_slot = slot
+        car.pool_slot = None
+        self.count = last
+
+class RoadsideLanes:
+    """Free vertical space in the two roadside lanes, used to place trees and flags.
+
+    Every lane object scrolls by the same amount each frame, so occupied
+    intervals are kept in track coordinates (screen y minus the total
+    scroll) and never need updating. Each lane is a pair of sorted start
+    and end lists of disjoint intervals. A free slot is found with a bisect
+    plus a walk over the few intervals inside the requested band, instead
+    of retrying random positions against every nearby object. An object's
+    reservation is kept on its own lane fields and the free gaps are
+    collected into one reused buffer, so recycling allocates nothing.
+    """
+    SIDES = ("left", "right")
+    # One spare pixel so neighbours never touch once positions are truncated to Rects
+    SPACING = 1
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.scrolled = 0.0
+        self.lanes = {side: ([], []) for side in self.SIDES}
+        # Flat (start, end) pairs of the free gaps found by the last find()
+        self.gaps = []
+
+    def scroll(self, dy):
+        self.scrolled += dy
+
+    def find(self, side, height, top, bottom):
+        """Return a random free screen y in [top, bottom] for an object of this height, or None."""
+        starts, ends = self.lanes[side]
+        height += self.SPACING
+        scrolled = self.scrolled
+        top -= scrolled
+        bottom -= scrolled
+        count = 0
+        total = 0.0
+        cursor = top
+        i = bisect.bisect_right(ends, top)
+        while cursor <= bottom:
+            if i == len(starts):
+                count = self._gap(count, cursor, bottom)
+                total += bottom - cursor
+                break
+            last = min(starts[i] - height, bottom)
+            if last >= cursor:
+                count = self._gap(count, cursor, last)
+                total += last - cursor
+            cursor = max(cursor, ends[i])
+            i += 1
+        if not count:
+            return None
+        gaps = self.gaps
+        pick = self.rng.uniform(0, total)
+        for j in range(0, count, 2):
+            size = gaps[j + 1] - gaps[j]
+            if pick <= size:
+                return gaps[j] + pick + scrolled
+            pick -= size
+        return gaps[count - 1] + scrolled
+
+    def _gap(self, count, start, end):
+        """Store a free gap at position count of the scratch buffer and return the new count."""
+        gaps = self.gaps
+        if count < len(gaps):
+            gaps[count] = start
+            gaps[count + 1] = end
+        else:
+            gaps.append(start)
+            gaps.append(end)
+        return count + 2
+
+    def find_above(self, side, height, bottom):
+        """Return the lowest free screen y at or above bottom; there always is one."""
+        starts, ends = self.lanes[side]
+        height += self.SPACING
+        y = bottom - self.scrolled
+        i = bisect.bisect_left(starts, y + height) - 1
+        while i >= 0 and ends[i] > y:
+            y = starts[i] - height
+            i -= 1
+        return y + self.scrolled
+
+    def pick(self, height, top, bottom):
+        """Find a free slot in a random lane, or the other one if that is full.
+
+        Returns (side, y); when both lanes are full in the band y is None
+        and side is the lane tried first.
+        """
+        first = self.rng.choice(self.SIDES)
+        y = self.find(first, height, top, bottom)
+        if y is not None:
+            return first, y
+        second = "right" if first == "left" else "left"
+        y = self.find(second, height, top, bottom)
+        return (first, None) if y is None else (second, y)
+
+    def reserve(self, side, y, height):
+        """Mark screen rows [y, y + height) of a lane as taken and return the track start."""
+        start = y - self.scrolled
+        self.insert(side, start, height)
+        return start
+
+    def insert(self, side, start, height):
+        """Mark track rows [start, start + height) of a lane as taken."""
+        starts, ends = self.lanes[side]
+        i = bisect.bisect_left(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, start + height + self.SPACING)
+
+    def clear(self):
+        """Free both lanes. Objects keep their lane fields, so callers re-attach every object."""
+        for starts, ends in self.lanes.values():
+            starts.clear()
+            ends.clear()
+
+    def add(self, obj, side):
+        """Reserve the lane interval under obj's current position."""
+        obj.lane = side
+        obj.lane_start = self.reserve(side, obj.y, obj.height)
+
+    def attach(self, obj, side, start):
+        """Reserve the interval at a known track start for obj, or mark obj as off the lanes."""
+        obj.lane = side
+        obj.lane_start = start
+        if side is not None:
+            self.insert(side, start, obj.height)
+
+    def discard(self, obj):
+        side = obj.lane
+        if side is None:
+            return
+        obj.lane = None
+        starts, ends = self.lanes[side]
+        i = bisect.bisect_left(starts, obj.lane_start)
+        del starts[i]
+        del ends[i]
+
+def roadside_x(rng, obj_type, side):
+    """Pick an x just off the road edge on the given side, as the original scenery did."""
+    if obj_type == ObjectType.TREE:
+        width, gap = CONFIG['TREE_WIDTH'], rng.randint(10, 50)
+    else:
+        width, gap = CONFIG['FLAG_WIDTH'], rng.randint(5, 30)
+    return CONFIG['ROAD_X'] - width - gap if side == "left" else CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + gap
+
+# Roadside objects that must not overlap each other
+SIDE_OBJECT_TYPES = (ObjectType.TREE, ObjectType.FLAG)
+
+def chunk_specs(seed, first=0):
+    """Endless seeded stream of track chunks for the streaming track mode, from chunk first on.
+
+    Each chunk is a list of (obj_type, x, y) with y measured down from the
+    chunk's top edge. Every object fits inside its chunk, so neighbouring
+    chunks never overlap. Chunk 0 is where the player starts and gets no
+    barriers or people.
+    """
+    height = CONFIG['CHUNK_HEIGHT']
+    number = first
+    while True:
+        # Every chunk has its own seed, so the stream can be resumed at any chunk
+        rng = random.Random((seed << 32) + number)
+        lanes = RoadsideLanes(rng)
+        specs = []
+        for obj_type, key in ((ObjectType.TREE, 'TREE'), (ObjectType.FLAG, 'FLAG')):
+            size = CONFIG[f'{key}_HEIGHT']
+            for _ in range(CONFIG[f'CHUNK_{key}S']):
+                side, y = lanes.pick(size, 0, height - size - RoadsideLanes.SPACING)
+                if y is not None:
+                    lanes.reserve(side, y, size)
+                    specs.append((obj_type, roadside_x(rng, obj_type, side), y))
+        if number:
+            for obj_type, key, count, chance in ((ObjectType.BARRIER, 'BARRIER', CONFIG['CHUNK_BARRIERS'], 1),
+                                                 (ObjectType.PERSON, 'PERSON', CONFIG['CHUNK_PEOPLE'], 0.5)):
+                for _ in range(count):
+                    if rng.random() < chance:
+                        x = rng.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG[f'{key}_WIDTH'] - 20)
+                        specs.append((obj_type, x, rng.randint(0, height - CONFIG[f'{key}_HEIGHT'])))
+        yield specs
+        number += 1
+
+class TrackStreamer:
+    """Turns chunk_specs() into objects ahead of the player and drops them behind.
+
+    Chunk k covers track rows HEIGHT - (k + 1) * CHUNK_HEIGHT up to
+    HEIGHT - k * CHUNK_HEIGHT, so chunk 0 fills the first screen. Only
+    chunks between the spawn area above the screen and the bottom edge
+    exist as objects. Objects from dropped chunks are kept per type and
+    reused.
+    """
+    def __init__(self, game, seed):
+        self.game = game
+        self.seed = seed
+        self.specs = chunk_specs(seed)
+        self.chunks = deque()
+        self.next_top = HEIGHT - CONFIG['CHUNK_HEIGHT']
+        self.spare = {obj_type: [] for obj_type in ObjectType}
+
+    def acquire(self, obj_type, x, y):
+        spare = self.spare[obj_type]
+        if not spare:
+            return self.game.object_class(x, y, assets.image(obj_type.value), obj_type)
+        obj = spare.pop()
+        obj.x = x
+        obj.y = y
+        return obj
+
+    def update(self, scrolled):
+        game = self.game
+        # Drop chunks whose top edge has scrolled past the bottom of the screen
+        while self.chunks and self.chunks[0][0] + scrolled > HEIGHT:
+            _, objects = self.chunks.popleft()
+            for obj in objects:
+                game.index.remove(obj)
+                self.spare[obj.type].append(obj)
+            # Chunks are added and dropped in order, so the oldest chunk's objects lead the list
+            del game.environment[:len(objects)]
+        # Generate until the spawn area above the screen is covered
+        while self.next_top + scrolled > -HEIGHT:
+            top = self.next_top + scrolled
+            objects = []
+            for obj_type, x, y in next(self.specs):
+                obj = self.acquire(obj_type, x, top + y)
+                game.add_environment_object(obj)
+                objects.append(obj)
+            self.chunks.append((self.next_top, objects))
+            self.next_top -= CONFIG['CHUNK_HEIGHT']
+
+    def restore(self, next_top, chunks):
+        """Resume streaming with the given live (top, objects) chunks and next chunk top."""
+        self.chunks = deque(chunks)
+        self.next_top = next_top
+        number = round((HEIGHT - CONFIG['CHUNK_HEIGHT'] - next_top) / CONFIG['CHUNK_HEIGHT'])
+        self.specs = chunk_specs(self.seed, number)
+
+class Game:
+    # Snapshot layout: header, scalars, player and RNG, a counts block, then one
+    # fixed-size record per opponent, environment object and streamed chunk, and
+    # the EntityStore free list. Slots are -1 for the python backend.
+    SNAPSHOT_MAGIC = b"SGSN"
+    SNAPSHOT_VERSION = 2
+    SNAPSHOT_HEADER = struct.Struct("<4sHBBBB")
+    SNAPSHOT_STATE = struct.Struct("<q6d")
+    SNAPSHOT_PLAYER = struct.Struct("<8d")
+    SNAPSHOT_RNG = struct.Struct("<i?d625I")
+    SNAPSHOT_COUNTS = struct.Struct("<IIIIdQ")
+    SNAPSHOT_OPPONENT = struct.Struct("<i3d")
+    SNAPSHOT_OBJECT = struct.Struct("<BBi3d")
+    SNAPSHOT_CHUNK = struct.Struct("<dI")
+    CRASH_CAUSES = (None, "opponent", ObjectType.PERSON.value)
+    OBJECT_TYPES = tuple(ObjectType)
+    LANE_SIDES = (None,) + RoadsideLanes.SIDES
+
+    def __init__(self, seed=None, timer=None, headless=HEADLESS, profiler=None):
+        # Injected RNG and time source keep headless runs reproducible
+        self.rng = random.Random(seed)
+        self.timer = timer or time.time
+        self.headless = headless
+        self.profiler = profiler or NULL_PROFILER
+        self.audio = NO_AUDIO if headless else audio
+        self.vectorized = CONFIG['ENTITY_BACKEND'] == "numpy"
+        if self.vectorized and np is None:
+            print("NumPy is not installed, falling back to the python entity backend")
+            self.vectorized = False
+        if self.vectorized:
+            self.index = EntityStore()
+            self.car_class, self.object_class = StoredCar, StoredEnvironmentObject
+        else:
+            self.index = SpatialHash()
+            self.car_class, self.object_class = Car, EnvironmentObject
+        self.player = Car(WIDTH // 2 - CONFIG['CAR_WIDTH'] // 2, HEIGHT - 150, assets.image('player_car'), CONFIG['MAX_SPEED'], True)
+        self.opponents = OpponentPool(self.car_class, assets.image('opponent_car'))
+        self.passed = []
+        self.environment = []
+        self.score = 0
+        self.game_over = False
+        self.crash_cause = None
+        self.last_opponent_time = self.timer()
+        self.opponent_interval = CONFIG['OPPONENT_MAX_INTERVAL']
+        self.start_time = self.timer()
+        # How far the scenery scrolled in the last tick
+        self.scroll_step = 0.0
+        self.audio.play('engine', loops=-1, at=self.start_time + 5)
+        self.lanes = RoadsideLanes(self.rng)
+        self.track = TrackStreamer(self, self.rng.getrandbits(64)) if CONFIG['TRACK_MODE'] == "stream" else None
+        self.setup_environment()
+
+    def check_overlap(self, new_obj, types=SIDE_OBJECT_TYPES):
+        """Check if new object overlaps a nearby environment object of the given types."""
+        for obj in self.index.query(new_obj.x, new_obj.y, new_obj.width, new_obj.height, exclude=new_obj):
+            if getattr(obj, "type", None) in types:
+                return True
+        return False
+
+    def add_environment_object(self, obj):
+        """Add an object to the scenery and register it with the spatial index."""
+        self.environment.append(obj)
+        self.index.insert(obj)
+
+    def place_roadside(self, obj, top, bottom, fallback=True):
+        """Move a tree or flag to a free lane slot with its top between top and bottom.
+
+        With fallback the object goes to the nearest free slot above the
+        band when both lanes are full there. Returns False if it could not
+        be placed.
+        """
+        side, y = self.lanes.pick(obj.height, top, bottom)
+        if y is None:
+            if not fallback:
+                return False
+            y = self.lanes.find_above(side, obj.height, top)
+        obj.y = y
+        obj.x = roadside_x(self.rng, obj.type, side)
+        self.lanes.add(obj, side)
+        return True
+
+    def setup_environment(self):
+        if self.track is not None:
+            self.track.update(self.lanes.scrolled)
+            return
+
+        # Place trees and flags without overlap
+        for obj_type, name, count in ((ObjectType.TREE, 'tree', 8), (ObjectType.FLAG, 'flag', 6)):
+            for _ in range(count):
+                obj = self.object_class(0, 0, assets.image(name), obj_type)
+                if self.place_roadside(obj, -HEIGHT, HEIGHT * 2, fallback=False):
+                    self.add_environment_object(obj)
+                else:
+                    print(f"Warning: Could not place {name} without overlap")
+
+        # Place barriers (rarer)
+        for _ in range(4):
+            x = self.rng.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['BARRIER_WIDTH'] - 20)
+            y = self.rng.randint(-HEIGHT, HEIGHT * 2)
+            self.add_environment_object(self.object_class(x, y, assets.image('barrier'), ObjectType.BARRIER))
+
+        # Place people
+        for _ in range(4):
+            if self.rng.random() > 0.5:
+                x = self.rng.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['PERSON_WIDTH'] - 20)
+                y = self.rng.randint(-HEIGHT, HEIGHT * 2)
+                self.add_environment_object(self.object_class(x, y, assets.image('person'), ObjectType.PERSON))
+
+    def road_offset(self):
+        return (self.player.speed * 10) % (CONFIG['MARKER_HEIGHT'] * 2)
+
+    def draw_road(self, surface, rects=None):
+        road.enqueue(render_queue, self.road_offset(), rects)
+        render_queue.submit(surface, 'background', False)
+
+    def add_opponent(self):
+        current_time = self.timer()
+        if current_time - self.last_opponent_time > self.opponent_interval:
+            x = self.rng.randint(CONFIG['ROAD_X'] + 50, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['CAR_WIDTH'] - 50)
+            speed = self.rng.uniform(2, 5) + self.score / 300
+            opponent = self.opponents.acquire(x, -CONFIG['CAR_HEIGHT'], speed)
+            if opponent is not None:
+                self.index.insert(opponent)
+            self.last_opponent_time = current_time
+            self.opponent_interval = max(CONFIG['OPPONENT_MIN_INTERVAL'], CONFIG['OPPONENT_MAX_INTERVAL'] - self.score / 300)
+
+    def check_collisions(self):
+        player = self.player
+        if CONFIG['PIXEL_COLLISIONS']:
+            # Broad phase on the rotated sprite's box, narrow phase on masks of the few overlaps
+            img, (x, y) = player.sprite()
+            hits = self.index.query(x, y, img.get_width(), img.get_height())
+            if hits:
+                hits = self.pixel_hits(player, x, y, hits)
+        else:
+            hits = self.index.query(player.x, player.y, player.width, player.height)
+        if not hits:
+            return
+
+        for hit in hits:
+            if isinstance(hit, Car):
+                self.end("opponent")
+                return
+
+        # Barriers are resolved before people, as in the original scan order
+        hits.sort(key=lambda obj: obj.type == ObjectType.PERSON)
+        for obj in hits:
+            if obj.type == ObjectType.BARRIER:
+                self.score += 100
+                self.audio.play('score')
+                # A streamed barrier is parked below the screen until its chunk is dropped
+                obj.y = -HEIGHT - obj.height if self.track is None else HEIGHT + 1
+                self.index.update(obj)
+            elif obj.type == ObjectType.PERSON:
+                self.audio.play('crash')
+                self.end(ObjectType.PERSON.value)
+                return
+
+    def pixel_hits(self, car, x, y, hits):
+        """Keep the hits whose opaque pixels touch the car's sprite drawn at (x, y)."""
+        mask = masks.get(car.img, car.angle)
+        touching = []
+        for obj in hits:
+            if isinstance(obj, Car):
+                _, (ox, oy) = obj.sprite()
+                other = masks.get(obj.img, obj.angle)
+            else:
+                # Truncated like the blit position of the scenery
+                ox, oy = int(obj.x), int(obj.y)
+                other = masks.get(obj.img)
+            if mask.overlap(other, (ox - x, oy - y)):
+                touching.append(obj)
+        return touching
+
+    def end(self, cause):
+        self.game_over = True
+        self.crash_cause = cause
+        self.audio.stop('engine')
+
+    def update(self):
+        if not self.game_over:
+            profiler = self.profiler
+            with profiler.section('add_opponent'):
+                self.add_opponent()
+            index = self.index
+            if self.vectorized:
+                # One batched move for every opponent and object, then handle the few that left the screen
+                with profiler.section('scroll'):
+                    self.scroll_step = self.player.speed * 0.5
+                    index.advance(self.scroll_step)
+                    self.lanes.scroll(self.scroll_step)
+                with profiler.section('recycle'):
+                    for obj in index.below(HEIGHT):
+                        if isinstance(obj, Car):
+                            index.remove(obj)
+                            self.opponents.release(obj)
+                        elif self.track is None:
+                            self.recycle_object(obj)
+                    if self.track is not None:
+                        self.track.update(self.lanes.scrolled)
+            else:
+                with profiler.section('scroll'):
+                    self.scroll_step = self.player.speed * 0.5
+                    pool = self.opponents
+                    cars = pool.cars
+                    i = 0
+                    while i < pool.count:
+                        opponent = cars[i]
+                        if opponent.move():
+                            index.remove(opponent)
+                            pool.release(opponent)
+                        else:
+                            index.update(opponent)
+                            i += 1
+
+                    # Scroll everything before recycling so placement sees this frame's positions
+                    passed = self.passed
+                    passed.clear()
+                    for obj in self.environment:
+                        obj.y += self.scroll_step
+                        if obj.y > HEIGHT:
+                            passed.append(obj)
+                        else:
+                            index.update(obj)
+                    self.lanes.scroll(self.scroll_step)
+                with profiler.section('recycle'):
+                    for obj in passed:
+                        if self.track is None:
+                            self.recycle_object(obj)
+                        index.update(obj)
+                    if self.track is not None:
+                        self.track.update(self.lanes.scrolled)
+
+            with profiler.section('check_collisions'):
+                self.check_collisions()
+
+    def recycle_object(self, obj):
+        """Move an object that scrolled off the bottom back above the screen."""
+        if obj.type in SIDE_OBJECT_TYPES:
+            self.lanes.discard(obj)
+            self.place_roadside(obj, -obj.height - 100, -obj.height)
+        elif obj.type == ObjectType.BARRIER:
+            obj.x = self.rng.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['BARRIER_WIDTH'] - 20)
+            obj.y = -obj.height - self.rng.randint(0, 100)
+        elif obj.type == ObjectType.PERSON:
+            obj.x = self.rng.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['PERSON_WIDTH'] - 20)
+            obj.y = -obj.height - self.rng.randint(0, 100)
+
+    def step(self, direction=None, dt=None):
+        """Advance the simulation by one fixed physics tick."""
+        player = self.player
+        player.prev_x = player.x
+        player.prev_angle = player.angle
+        if not self.game_over:
+            with self.profiler.section('player.move'):
+                self.player.move(direction)
+        with self.profiler.section('update'):
+            self.update()
+        if hasattr(self.timer, "advance"):
+            self.timer.advance(dt if dt is not None else 1.0 / CONFIG['FPS'])
+
+    def draw(self, surface=None, background_rects=None, alpha=1.0):
+        """Draw the frame and return the rects covered by sprites and HUD.
+
+        With background_rects only those regions of the road are repainted.
+        alpha is how far the frame falls between the previous physics tick
+        (0) and the current one (1); sprites are interpolated to match.
+        """
+        surface = surface or screen
+        profiler = self.profiler
+        with profiler.section('draw_road'):
+            self.draw_road(surface, background_rects)
+        # Layers are submitted back to front, one blits() call each
+        queue = render_queue
+        back = 0.0 if self.game_over else 1.0 - alpha
+        with profiler.section('draw_objects'):
+            queue.add_objects('scenery', self.environment, -back * self.scroll_step)
+            drawn = queue.submit(surface, 'scenery')
+        with profiler.section('draw_cars'):
+            queue.add_cars('traffic', self.opponents, back)
+            drawn += queue.submit(surface, 'traffic')
+            queue.add_cars('player', (self.player,), back)
+            drawn += queue.submit(surface, 'player')
+        with profiler.section('draw_hud'):
+            hud.enqueue(queue, self)
+            drawn += queue.submit(surface, 'hud')
+        drawn.extend(profiler.draw(surface))
+        return drawn
+
+    def snapshot(self):
+        """Pack the complete game state, RNG included, into bytes for restore()."""
+        player = self.player
+        track = self.track
+        opponents = list(self.opponents)
+        free = self.index.free if self.vectorized else []
+        version, state, gauss = self.rng.getstate()
+        parts = [
+            self.SNAPSHOT_HEADER.pack(self.SNAPSHOT_MAGIC, self.SNAPSHOT_VERSION, self.game_over,
+                                      self.CRASH_CAUSES.index(self.crash_cause), track is not None,
+                                      self.vectorized),
+            self.SNAPSHOT_STATE.pack(self.score, self.timer(), self.last_opponent_time, self.start_time,
+                                     self.opponent_interval, self.scroll_step, self.lanes.scrolled),
+            self.SNAPSHOT_PLAYER.pack(player.x, player.y, player.speed, player.max_speed, player.angle,
+                                      player.target_angle, player.prev_x, player.prev_angle),
+            self.SNAPSHOT_RNG.pack(version, gauss is not None, gauss or 0.0, *state),
+            self.SNAPSHOT_COUNTS.pack(len(opponents), len(self.environment), len(track.chunks) if track else 0,
+                                      len(free), track.next_top if track else 0, track.seed if track else 0),
+        ]
+        for car in opponents:
+            parts.append(self.SNAPSHOT_OPPONENT.pack(getattr(car, "slot", -1), car.x, car.y, car.speed))
+        for obj in self.environment:
+            parts.append(self.SNAPSHOT_OBJECT.pack(self.OBJECT_TYPES.index(obj.type), self.LANE_SIDES.index(obj.lane),
+                                                   getattr(obj, "slot", -1), obj.x, obj.y, obj.lane_start))
+        if track:
+            for top, objects in track.chunks:
+                parts.append(self.SNAPSHOT_CHUNK.pack(top, len(objects)))
+        parts.append(struct.pack(f"<{len(free)}i", *free))
+        return b"".join(parts)
+
+    def restore(self, data):
+        """Put the game back into the state captured by snapshot().
+
+        Existing opponents and objects are reused, so restoring into a live
+        game allocates almost nothing. A SimClock timer is set back to the
+        snapshot time; with a wall clock the saved times shift to now. The
+        numpy backend also gets its saved row layout back, since the order
+        of off-screen rows decides the order of later RNG draws.
+        """
+        magic, version, game_over, cause, streamed, stored = self.SNAPSHOT_HEADER.unpack_from(data)
+        if magic != self.SNAPSHOT_MAGIC or version != self.SNAPSHOT_VERSION:
+            raise ValueError(f"not a version {self.SNAPSHOT_VERSION} game snapshot")
+        if streamed != (self.track is not None):
+            raise ValueError("snapshot was taken in a different track mode")
+        offset = self.SNAPSHOT_HEADER.size
+        score, now, last_opponent_time, start_time, opponent_interval, scroll_step, scrolled = \
+            self.SNAPSHOT_STATE.unpack_from(data, offset)
+        offset += self.SNAPSHOT_STATE.size
+        player = self.player
+        (player.x, player.y, player.speed, player.max_speed, player.angle,
+         player.target_angle, player.prev_x, player.prev_angle) = self.SNAPSHOT_PLAYER.unpack_from(data, offset)
+        offset += self.SNAPSHOT_PLAYER.size
+        rng = self.SNAPSHOT_RNG.unpack_from(data, offset)
+        self.rng.setstate((rng[0], rng[3:], rng[2] if rng[1] else None))
+        offset += self.SNAPSHOT_RNG.size
+        opponent_count, object_count, chunk_count, free_count, next_top, track_seed = \
+            self.SNAPSHOT_COUNTS.unpack_from(data, offset)
+        offset += self.SNAPSHOT_COUNTS.size
+
+        if hasattr(self.timer, "now"):
+            self.timer.now = now
+            shift = 0.0
+        else:
+            shift = self.timer() - now
+        self.score = score
+        self.game_over = bool(game_over)
+        self.crash_cause = self.CRASH_CAUSES[cause]
+        self.last_opponent_time = last_opponent_time + shift
+        self.start_time = start_time + shift
+        self.opponent_interval = opponent_interval
+        self.scroll_step = scroll_step
+        self.passed.clear()
+
+        index = self.index
+        pool = self.opponents
+        spare = self.track.spare if self.track else {obj_type: [] for obj_type in ObjectType}
+        while pool.count:
+            car = pool.cars[pool.count - 1]
+            index.remove(car)
+            pool.release(car)
+        for obj in self.environment:
+            index.remove(obj)
+            spare[obj.type].append(obj)
+        self.environment.clear()
+        # Rows only go back to their saved slots when both games use the numpy backend
+        layout = self.vectorized and stored
+        if layout:
+            while index.capacity < opponent_count + object_count + free_count:
+                index._grow(index.capacity * 2)
+
+        end = offset + opponent_count * self.SNAPSHOT_OPPONENT.size
+        for slot, x, y, speed in self.SNAPSHOT_OPPONENT.iter_unpack(data[offset:end]):
+            car = pool.acquire(x, y, speed)
+            if car is None:
+                continue
+            if layout:
+                index.insert(car, slot)
+            else:
+                index.insert(car)
+        offset = end
+
+        lanes = self.lanes
+        lanes.clear()
+        lanes.scrolled = scrolled
+        end = offset + object_count * self.SNAPSHOT_OBJECT.size
+        for type_code, lane, slot, x, y, start in self.SNAPSHOT_OBJECT.iter_unpack(data[offset:end]):
+            obj_type = self.OBJECT_TYPES[type_code]
+            objects = spare[obj_type]
+            if objects:
+                obj = objects.pop()
+                obj.x = x
+                obj.y = y
+            else:
+                obj = self.object_class(x, y, assets.image(obj_type.value), obj_type)
+            self.environment.append(obj)
+            if layout:
+                index.insert(obj, slot)
+            else:
+                index.insert(obj)
+            lanes.attach(obj, self.LANE_SIDES[lane], start)
+        offset = end
+
+        if self.track:
+            chunks = []
+            first = 0
+            end = offset + chunk_count * self.SNAPSHOT_CHUNK.size
+            for top, count in self.SNAPSHOT_CHUNK.iter_unpack(data[offset:end]):
+                chunks.append((top, self.environment[first:first + count]))
+                first += count
+            # The track comes from the snapshot's seed, not from the one this game was built with
+            self.track.seed = track_seed
+            self.track.restore(next_top, chunks)
+            offset = end
+        if layout:
+            index.free[:] = struct.unpack_from(f"<{free_count}i", data, offset)
+
+        self.audio.stop('engine')
+        if not self.game_over:
+            self.audio.play('engine', loops=-1, at=self.start_time + 5)
+
+    @classmethod
+    def from_snapshot(cls, data, **kwargs):
+        """Build a new game (Game() keyword arguments) and restore a snapshot into it."""
+        game = cls(**kwargs)
+        game.restore(data)
+        return game
+
+# Input codes stored in recordings
+DIRECTIONS = (None, "left", "right")
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+class Recorder:
+    """Writes a compact binary input log that replay.py can re-run headlessly.
+
+    The file is a header followed by one block per game: the RNG seed, the
+    tick count and one byte per physics tick holding the direction code.
+    Every tick is 1/fps seconds of game time, with fps taken from the header.
+    Since version 3 the header also stores the track mode and whether pixel
+    collisions were on, as both change how the same inputs play out.
+    Version 2 logs lack those settings, and version 1 logs stored one uint16
+    per rendered frame, with the frame's dt in milliseconds above a 2-bit
+    direction code; both are still readable.
+    """
+    MAGIC = b"SGRC"
+    VERSION = 3
+    HEADER = struct.Struct("<4sHH")
+    SETTINGS = struct.Struct("<BB")
+    EPISODE = struct.Struct("<QI")
+    TRACK_MODES = ("loop", "stream")
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION, CONFIG['FPS']))
+        self.file.write(self.SETTINGS.pack(self.TRACK_MODES.index(CONFIG['TRACK_MODE']),
+                                           bool(CONFIG['PIXEL_COLLISIONS'])))
+        self.seed = None
+        self.frames = bytearray()
+
+    def start(self, seed):
+        """Begin a new game, flushing the previous one."""
+        self.flush()
+        # Fail before the game is played rather than when its inputs are written
+        if not 0 <= seed < 1 << 64:
+            raise ValueError(f"cannot record seed {seed}, recordings store seeds from 0 to {(1 << 64) - 1}")
+        self.seed = seed
+
+    def record(self, direction):
+        """Log the input for one physics tick."""
+        self.frames.append(DIRECTION_CODES[direction])
+
+    def flush(self):
+        if self.seed is None:
+            return
+        self.file.write(self.EPISODE.pack(self.seed, len(self.frames)))
+        self.file.write(self.frames)
+        self.file.flush()
+        self.seed = None
+        self.frames = bytearray()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+def read_recording(path):
+    """Return the recorded fps, settings and a list of (seed, [(direction, dt_seconds), ...]) games.
+
+    settings maps CONFIG keys to the values the recording was made with; it
+    is empty for version 1 and 2 logs, which did not store them.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, fps = Recorder.HEADER.unpack_from(data)
+    if magic != Recorder.MAGIC or not 1 <= version <= Recorder.VERSION:
+        raise ValueError(f"{path} is not a version 1 to {Recorder.VERSION} recording")
+    games = []
+    settings = {}
+    offset = Recorder.HEADER.size
+    if version >= 3:
+        track, pixel_collisions = Recorder.SETTINGS.unpack_from(data, offset)
+        offset += Recorder.SETTINGS.size
+        if track >= len(Recorder.TRACK_MODES):
+            raise ValueError(f"{path} has unknown track mode {track}")
+        settings = {'TRACK_MODE': Recorder.TRACK_MODES[track], 'PIXEL_COLLISIONS': bool(pixel_collisions)}
+    while offset < len(data):
+        seed, count = Recorder.EPISODE.unpack_from(data, offset)
+        offset += Recorder.EPISODE.size
+        if version == 1:
+            frames = array('H')
+            frames.frombytes(data[offset:offset + count * 2])
+            if sys.byteorder == "big":
+                frames.byteswap()
+            offset += count * 2
+            games.append((seed, [(DIRECTIONS[code & 3], (code >> 2) / 1000) for code in frames]))
+        else:
+            tick = 1.0 / fps
+            games.append((seed, [(DIRECTIONS[code], tick) for code in data[offset:offset + count]]))
+            offset += count
+    return fps, settings, games
+
+class FrameLayout:
+    """Size and byte order of a surface's pixels, as copied out by copy_frame()."""
+    def __init__(self, surface):
+        self.width, self.height = surface.get_size()
+        self.bytesize = surface.get_bytesize()
+        self.pitch = surface.get_pitch()
+        self.size = self.width * self.height * self.bytesize
+        # Byte offset of red, green and blue within a pixel
+        shifts = surface.get_shifts()[:3]
+        if sys.byteorder == "little":
+            self.offsets = tuple(shift // 8 for shift in shifts)
+        else:
+            self.offsets = tuple(self.bytesize - 1 - shift // 8 for shift in shifts)
+        self.alpha = bool(surface.get_masks()[3])
+
+    def pixel_format(self):
+        """The matching ffmpeg -pix_fmt name, or None for layouts it has no name for."""
+        names = {(4, (2, 1, 0)): "bgra" if self.alpha else "bgr0", (4, (0, 1, 2)): "rgba" if self.alpha else "rgb0",
+                 (3, (2, 1, 0)): "bgr24", (3, (0, 1, 2)): "rgb24"}
+        return names.get((self.bytesize, self.offsets))
+
+def copy_frame(surface, layout, frame):
+    """Copy the surface's pixels into the preallocated frame, straight from its buffer."""
+    view = memoryview(surface.get_buffer())
+    try:
+        row = layout.width * layout.bytesize
+        if layout.pitch == row:
+            memoryview(frame)[:] = view
+        else:
+            # Drop the padding at the end of every row
+            target = memoryview(frame)
+            for y in range(layout.height):
+                target[y * row:(y + 1) * row] = view[y * layout.pitch:y * layout.pitch + row]
+    finally:
+        # Releasing the view unlocks the surface
+        view.release()
+
+def encode_png(frame, layout, level=None):
+    """Encode a frame from copy_frame() as an RGB PNG.
+
+    pygame.image.save() holds the GIL while it compresses, which would stall
+    the game loop for tens of milliseconds per frame. Here the channels are
+    shuffled with slice copies and zlib compresses with the GIL released.
+    """
+    width, height = layout.width, layout.height
+    rgb = bytearray(width * height * 3)
+    for channel, offset in enumerate(layout.offsets):
+        rgb[channel::3] = frame[offset::layout.bytesize]
+    stride = width * 3
+    rows = memoryview(rgb)
+    # Every scanline starts with filter type 0 (none)
+    raw = b"".join(part for y in range(height) for part in (b"\0", rows[y * stride:(y + 1) * stride]))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    level = CONFIG['CAPTURE_PNG_LEVEL'] if level is None else level
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, level)) + chunk(b"IEND", b"")
+
+class PngSequence:
+    """Writes frames as numbered PNG files in a directory."""
+    def __init__(self, directory, layout, prefix="frame"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.layout = layout
+        self.prefix = prefix
+
+    def write(self, number, frame):
+        with open(os.path.join(self.directory, f"{self.prefix}_{number:06d}.png"), "wb") as f:
+            f.write(encode_png(frame, self.layout))
+
+    def close(self):
+        pass
+
+class RawStream:
+    """Appends frames' raw pixels to one file, as ffmpeg's rawvideo format expects."""
+    def __init__(self, path):
+        self.file = open(path, "wb")
+
+    def write(self, number, frame):
+        self.file.write(frame)
+
+    def close(self):
+        self.file.close()
+
+class PipeSink:
+    """Pipes raw frames into the stdin of an encoder process, e.g. ffmpeg -f rawvideo -i -."""
+    def __init__(self, command):
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE)
+
+    def write(self, number, frame):
+        self.process.stdin.write(frame)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+
+class FrameCapture:
+    """Copies the screen into a bounded ring of preallocated frames written out by a worker thread.
+
+    grab() never blocks the game loop. When every frame is still waiting on
+    the writer, the 'drop-oldest' policy reuses the oldest unwritten frame
+    and 'drop-newest' skips the new one. The worker hands written frames
+    back, so capture allocates nothing after start-up.
+    """
+    POLICIES = ("drop-oldest", "drop-newest")
+
+    def __init__(self, surface, sink, slots=None, policy="drop-oldest"):
+        self.surface = surface
+        self.layout = FrameLayout(surface)
+        self.sink = sink
+        self.policy = policy
+        self.free = [bytearray(self.layout.size) for _ in range(slots or CONFIG['CAPTURE_SLOTS'])]
+        self.filled = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.failed = False
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.worker = threading.Thread(target=self._drain, name="frame-capture", daemon=True)
+        self.worker.start()
+
+    def grab(self, number):
+        """Queue a copy of the surface as frame number; returns False if the frame was dropped."""
+        with self.condition:
+            if self.failed:
+                return False
+            if self.free:
+                frame = self.free.pop()
+            elif self.policy == "drop-oldest" and self.filled:
+                _, frame = self.filled.popleft()
+                self.dropped += 1
+            else:
+                self.dropped += 1
+                return False
+        copy_frame(self.surface, self.layout, frame)
+        with self.condition:
+            self.filled.append((number, frame))
+            self.captured += 1
+            self.condition.notify()
+        return True
+
+    def _drain(self):
+        while True:
+            with self.condition:
+                while not self.filled and not self.closed:
+                    self.condition.wait()
+                if not self.filled:
+                    return
+                number, frame = self.filled.popleft()
+            try:
+                self.sink.write(number, frame)
+            except (OSError, ValueError) as e:
+                print(f"Failed to write captured frame {number}: {e}")
+                with self.condition:
+                    self.failed = True
+                    self.filled.clear()
+                return
+            with self.condition:
+                self.free.append(frame)
+                self.written += 1
+
+    def close(self):
+        """Write the queued frames, stop the worker and close the sink."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.worker.join()
+        try:
+            self.sink.close()
+        except OSError as e:
+            print(f"Failed to close capture output: {e}")
+        print(f"Captured {self.captured} frames, wrote {self.written}, dropped {self.dropped}")
+
+class InstantReplay:
+    """The last seconds of captured frames, kept in a preallocated ring and dumped as PNGs on demand.
+
+    Frames are overwritten in place, so keeping the history costs one buffer
+    copy per captured frame. dump() hands the ring to a writer thread, and
+    grab() skips frames until it is done so the dump is never overwritten.
+    """
+    def __init__(self, surface, seconds, fps=None, directory="replays"):
+        self.surface = surface
+        self.layout = FrameLayout(surface)
+        self.frames = [bytearray(self.layout.size) for _ in range(max(1, round(seconds * (fps or CONFIG['CAPTURE_FPS']))))]
+        self.numbers = [None] * len(self.frames)
+        self.next = 0
+        self.directory = directory
+        self.dumps = 0
+        self.writer = None
+
+    def busy(self):
+        return self.writer is not None and self.writer.is_alive()
+
+    def grab(self, number):
+        if self.busy():
+            return False
+        copy_frame(self.surface, self.layout, self.frames[self.next])
+        self.numbers[self.next] = number
+        self.next = (self.next + 1) % len(self.frames)
+        return True
+
+    def dump(self):
+        """Start writing the kept frames, oldest first; returns the target directory or None."""
+        if self.busy():
+            return None
+        order = [i for i in range(self.next, self.next + len(self.frames))
+                 if self.numbers[i % len(self.frames)] is not None]
+        if not order:
+            return None
+        self.dumps += 1
+        directory = os.path.join(self.directory, time.strftime("%Y%m%d-%H%M%S") + f"-{self.dumps}")
+        self.writer = threading.Thread(target=self._write, args=(directory, order), name="instant-replay", daemon=True)
+        self.writer.start()
+        return directory
+
+    def _write(self, directory, order):
+        try:
+            sink = PngSequence(directory, self.layout)
+            for i in order:
+                i %= len(self.frames)
+                sink.write(self.numbers[i], self.frames[i])
+            print(f"Saved a {len(order)}-frame instant replay to {directory}")
+        except OSError as e:
+            print(f"Failed to save instant replay to {directory}: {e}")
+        # The next replay starts from an empty history
+        self.numbers = [None] * len(self.frames)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.join()
+
+class WorldSnapshot:
+    """What drawing one physics tick needs, copied out of the game for another thread.
+
+    Positions are copied into tuples when the snapshot is taken and never
+    change afterwards; sprites are shared, since the game never modifies
+    them. published is the perf_counter() time the tick finished.
+    """
+    __slots__ = ('tick', 'published', 'time', 'score', 'game_over', 'player', 'road_offset',
+                 'scroll_step', 'opponents', 'objects')
+
+    def __init__(self, game, tick, published):
+        player = game.player
+        self.tick = tick
+        self.published = published
+        self.time = game.timer()
+        self.score = game.score
+        self.game_over = game.game_over
+        self.player = (player.x, player.angle, player.prev_x, player.prev_angle, player.speed)
+        self.road_offset = game.road_offset()
+        self.scroll_step = game.scroll_step
+        self.opponents = tuple((car.x, car.y, car.speed) for car in game.opponents)
+        self.objects = tuple((obj.img, obj.x, obj.y) for obj in game.environment)
+
+class TripleBuffer:
+    """Hands the newest value from one writer thread to one reader thread.
+
+    The writer fills its back slot and publish() swaps it with the ready
+    slot; latest() swaps a newly published ready slot to the front. The
+    lock only covers the swaps, so neither side waits on the other's work,
+    and the reader keeps its front value until it asks for a newer one.
+    """
+    def __init__(self, value=None):
+        self.slots = [value, value, value]
+        self.back, self.ready, self.front = 0, 1, 2
+        self.fresh = False
+        self.lock = threading.Lock()
+
+    def publish(self, value):
+        self.slots[self.back] = value
+        with self.lock:
+            self.back, self.ready = self.ready, self.back
+            self.fresh = True
+
+    def latest(self):
+        with self.lock:
+            if self.fresh:
+                self.front, self.ready = self.ready, self.front
+                self.fresh = False
+            return self.slots[self.front]
+
+class SnapshotRenderer:
+    """Draws WorldSnapshots the way Game.draw() draws a live game.
+
+    Snapshot entries are loaded into reused Car and EnvironmentObject
+    stand-ins, so they go through the same sprite, interpolation and
+    culling code.
+    """
+    def __init__(self):
+        self.player = None
+        self.cars = []
+        self.objects = []
+        self.score = 0
+        self.game_over = False
+
+    def draw(self, surface, snapshot, alpha=1.0, profiler=NULL_PROFILER):
+        if self.player is None:
+            self.player = Car(WIDTH // 2 - CONFIG['CAR_WIDTH'] // 2, HEIGHT - 150, assets.image('player_car'),
+                              CONFIG['MAX_SPEED'], True)
+        player = self.player
+        player.x, player.angle, player.prev_x, player.prev_angle, player.speed = snapshot.player
+        self.score = snapshot.score
+        self.game_over = snapshot.game_over
+
+        cars = self.cars
+        while len(cars) < len(snapshot.opponents):
+            cars.append(Car(0, 0, assets.image('opponent_car'), 0))
+        for car, (x, y, speed) in zip(cars, snapshot.opponents):
+            car.x = x
+            car.y = y
+            car.speed = speed
+        objects = self.objects
+        while len(objects) < len(snapshot.objects):
+            objects.append(EnvironmentObject(0, 0, snapshot.objects[len(objects)][0], None))
+        for obj, (img, x, y) in zip(objects, snapshot.objects):
+            if obj.img is not img:
+                obj.img = img
+                obj.width = img.get_width()
+                obj.height = img.get_height()
+            obj.x = x
+            obj.y = y
+
+        queue = render_queue
+        back = 0.0 if snapshot.game_over else 1.0 - alpha
+        with profiler.section('draw_road'):
+            road.enqueue(queue, snapshot.road_offset)
+            queue.submit(surface, 'background', False)
+        with profiler.section('draw_objects'):
+            queue.add_objects('scenery', objects[:len(snapshot.objects)], -back * snapshot.scroll_step)
+            queue.submit(surface, 'scenery', False)
+        with profiler.section('draw_cars'):
+            queue.add_cars('traffic', cars[:len(snapshot.opponents)], back)
+            queue.submit(surface, 'traffic', False)
+            queue.add_cars('player', (player,), back)
+            queue.submit(surface, 'player', False)
+        with profiler.section('draw_hud'):
+            hud.enqueue(queue, self)
+            queue.submit(surface, 'hud', False)
+        profiler.draw(surface)
+
+class Simulation:
+    """The current game with its checkpoint and recording, advanced one fixed tick at a time.
+
+    main() ticks it between frames, or on a SimulationThread with
+    --threaded. The render loop sets input and queues commands with post();
+    both are picked up by the next tick, on whichever thread runs it.
+    """
+    def __init__(self, seed=None, recorder=None, profiler=NULL_PROFILER, probe=None):
+        self.recorder = recorder
+        self.profiler = profiler
+        self.probe = probe
+        self.commands = deque()
+        # Steering direction and the probe's change count when it was read
+        self.input = (None, 0)
+        self.ticks = 0
+        self.restart(seed)
+
+    def restart(self, seed=None):
+        # Physics runs in fixed ticks, so a recording of per-tick input replays exactly
+        seed = random.randrange(1 << 32) if seed is None else seed
+        if self.recorder:
+            self.recorder.start(seed)
+        self.game = Game(seed=seed, timer=SimClock(), profiler=self.profiler)
+        # F5 overwrites the checkpoint and F9 jumps back to it; each new game starts one
+        self.checkpoint = self.game.snapshot()
+
+    def post(self, command):
+        """Queue 'restart', 'save' or 'restore' for run_commands(), which every tick starts with."""
+        self.commands.append(command)
+
+    def run_commands(self):
+        while self.commands:
+            command = self.commands.popleft()
+            if command == 'restart':
+                # A repeated R press may arrive before the first restart was seen
+                if self.game.game_over:
+                    self.restart()
+            elif command == 'save':
+                self.checkpoint = self.game.snapshot()
+            elif command == 'restore':
+                self.game.restore(self.checkpoint)
+
+    def tick(self, dt):
+        self.run_commands()
+        direction, changes = self.input
+        game = self.game
+        if self.recorder and not game.game_over:
+            self.recorder.record(direction)
+        game.step(direction, dt)
+        self.ticks += 1
+        if self.probe:
+            self.probe.applied(changes, self.ticks, time.perf_counter())
+
+class SimulationThread:
+    """Ticks a Simulation on its own thread and publishes a WorldSnapshot after every tick.
+
+    Ticks are paced against perf_counter() instead of frames, so a slow
+    draw or flip no longer delays physics or makes it catch up in bursts.
+    Like main()'s loop, it drops time rather than spiral once it falls
+    MAX_TICKS_PER_FRAME ticks behind. An exception ends the thread and is
+    kept in error for the render loop to raise.
+    """
+    def __init__(self, simulation, buffer, tick):
+        self.simulation = simulation
+        self.buffer = buffer
+        self.tick = tick
+        self.running = False
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+
+    def start(self):
+        self.publish()
+        self.running = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+    def publish(self):
+        simulation = self.simulation
+        self.buffer.publish(WorldSnapshot(simulation.game, simulation.ticks, time.perf_counter()))
+
+    def _run(self):
+        tick = self.tick
+        next_tick = time.perf_counter() + tick
+        try:
+            while self.running:
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -tick * CONFIG['MAX_TICKS_PER_FRAME']:
+                    next_tick -= delay
+                self.simulation.tick(tick)
+                self.publish()
+                next_tick += tick
+        except Exception as e:
+            self.error = e
+
+class LatencyProbe:
+    """Times each steering change from the frame that reads it to the tick that applies it and the flip that shows it.
+
+    Tick times are kept as well: a render stall in the single-threaded
+    loop shows up as a long gap between ticks followed by a catch-up burst.
+    """
+    def __init__(self):
+        self.direction = None
+        # [read at, applying tick, applied at, shown at] per change of direction
+        self.changes = []
+        self.applied_count = 0
+        self.shown_count = 0
+        self.tick_times = []
+
+    def sample(self, direction, now):
+        """Note the direction read this frame; returns the change count to hand to applied()."""
+        if direction != self.direction:
+            self.direction = direction
+            self.changes.append([now, None, None, None])
+        return len(self.changes)
+
+    def applied(self, count, tick, now):
+        self.tick_times.append(now)
+        changes = self.changes
+        for i in range(self.applied_count, count):
+            changes[i][1] = tick
+            changes[i][2] = now
+        self.applied_count = max(self.applied_count, count)
+
+    def displayed(self, tick, now):
+        """Note a finished flip of the state after the given tick."""
+        changes = self.changes
+        i = self.shown_count
+        while i < self.applied_count and changes[i][1] <= tick:
+            changes[i][3] = now
+            i += 1
+        self.shown_count = i
+
+    @staticmethod
+    def percentiles(values):
+        """(p50, p99, max) of values, in milliseconds."""
+        ordered = sorted(values)
+        if not ordered:
+            return (0.0, 0.0, 0.0)
+        pick = lambda p: ordered[min(len(ordered) - 1, len(ordered) * p // 100)] * 1000
+        return (pick(50), pick(99), ordered[-1] * 1000)
+
+    def summary(self, origins=None):
+        """Percentiles of input-to-tick, input-to-frame and tick-to-tick delays.
+
+        Delays are measured from when each change was read, or from
+        origins[i] for change i when the true press times are known.
+        """
+        to_tick = []
+        to_frame = []
+        for i, (read, _, applied, shown) in enumerate(self.changes[:self.shown_count]):
+            start = origins[i] if origins is not None and i < len(origins) else read
+            to_tick.append(applied - start)
+            to_frame.append(shown - start)
+        times = self.tick_times
+        return {
+            'input_to_tick': self.percentiles(to_tick),
+            'input_to_frame': self.percentiles(to_frame),
+            'tick_interval': self.percentiles([b - a for a, b in zip(times, times[1:])]),
+        }
+
+    def report(self):
+        for name, (p50, p99, worst) in self.summary().items():
+            print(f"{name:>15}: p50 {p50:6.1f} ms  p99 {p99:6.1f} ms  max {worst:6.1f} ms")
+
+def run_headless(policy=None, seed=None, max_steps=100000, dt=None):
+    """Play one episode with a fixed timestep and return the finished game.
+
+    policy is called with the game each tick and returns "left", "right" or None.
+    """
+    game = Game(seed=seed, timer=SimClock(), headless=True)
+    steps = 0
+    while not game.game_over and steps < max_steps:
+        game.step(policy(game) if policy else None, dt)
+        steps += 1
+    return game
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simple car racing game")
+    parser.add_argument("--render", choices=("full", "dirty"), default=CONFIG['RENDER_MODE'],
+                        help="push the whole frame each tick or only the changed regions")
+    parser.add_argument("--fps", type=int, default=CONFIG['RENDER_FPS'],
+                        help="cap on rendered frames per second (default %(default)s), 0 for uncapped; "
+                             "physics always ticks at FPS")
+    parser.add_argument("--track", choices=("loop", "stream"), default=CONFIG['TRACK_MODE'],
+                        help="recycle a fixed set of scenery or stream seeded track chunks")
+    parser.add_argument("--seed", type=int, help="RNG seed for the first game, 0 to 2**64 - 1 (random by default)")
+    parser.add_argument("--record", metavar="PATH", help="write every game's seed and inputs to a replay log")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="time each loop phase (F3 toggles the overlay) and write a .csv or .json trace on exit")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="capture frames to PATH: PNG files in a directory, or one raw stream if it ends in .raw")
+    parser.add_argument("--capture-pipe", metavar="COMMAND",
+                        help="pipe raw frames to COMMAND's stdin; {width}, {height}, {fps} and {pix_fmt} are filled in")
+    parser.add_argument("--capture-fps", type=int, default=CONFIG['CAPTURE_FPS'],
+                        help="captured frames per second of game time")
+    parser.add_argument("--capture-policy", choices=FrameCapture.POLICIES, default="drop-oldest",
+                        help="which frame to drop when the writer falls behind")
+    parser.add_argument("--instant-replay", type=float, metavar="SECONDS",
+                        help="keep the last SECONDS of frames and save them as PNGs in replays/ on game over")
+    parser.add_argument("--threaded", action="store_true",
+                        help="tick physics on its own thread and draw the latest published state")
+    parser.add_argument("--latency", action="store_true",
+                        help="print input-to-tick, input-to-frame and tick interval percentiles on exit")
+    args = parser.parse_args(argv)
+    # Recordings store seeds as uint64
+    if args.seed is not None and not 0 <= args.seed < 1 << 64:
+        parser.error(f"--seed must be between 0 and {(1 << 64) - 1}, not {args.seed}")
+    return args
+
+def play(args, probe=None):
+    """Run game sessions until the window closes; probe, if given, times input latency."""
+    CONFIG['TRACK_MODE'] = args.track
+    if args.threaded and args.render == "dirty":
+        print("Dirty rendering needs the live game, so --threaded draws full frames")
+    init_display()
+    audio.start()
+    clock = pygame.time.Clock()
+    renderer = DirtyRenderer() if args.render == "dirty" and not args.threaded else None
+    profiler = Profiler() if args.profile else NULL_PROFILER
+    if probe is None and args.latency:
+        probe = LatencyProbe()
+    recorder = Recorder(args.record) if args.record else None
+    capture = None
+    if args.capture or args.capture_pipe:
+        layout = FrameLayout(screen)
+        try:
+            if args.capture_pipe:
+                sink = PipeSink(args.capture_pipe.format(width=layout.width, height=layout.height,
+                                                         fps=args.capture_fps, pix_fmt=layout.pixel_format()))
+            elif args.capture.endswith(".raw"):
+                sink = RawStream(args.capture)
+                print(f"Capturing {layout.width}x{layout.height} {layout.pixel_format()} frames "
+                      f"at {args.capture_fps} fps to {args.capture}")
+            else:
+                sink = PngSequence(args.capture, layout)
+            capture = FrameCapture(screen, sink, policy=args.capture_policy)
+        except (OSError, ValueError) as e:
+            print(f"Failed to start frame capture: {e}")
+    instant_replay = InstantReplay(screen, args.instant_replay, args.capture_fps) if args.instant_replay else None
+    # Frames are taken per capture interval of game time, so output plays back at real speed
+    capture_interval = 1.0 / args.capture_fps
+    capture_time = 0.0
+    captured_frames = 0
+    replay_saved = False
+
+    # The profiler's frames belong to the render loop, so a simulation thread does not report into them
+    simulation = Simulation(args.seed, recorder, NULL_PROFILER if args.threaded else profiler, probe)
+    tick = 1.0 / CONFIG['FPS']
+    accumulator = 0.0
+    last_frame = time.perf_counter()
+    # Steering stays within +/-15 degrees, so every player rotation can be rendered up front
+    rotations.warm(simulation.game.player.img)
+    sim_thread = None
+    if args.threaded:
+        buffer = TripleBuffer()
+        view = SnapshotRenderer()
+        sim_thread = SimulationThread(simulation, buffer, tick)
+        sim_thread.start()
+        snapshot = buffer.latest()
+        # Capped at or below the tick rate, a frame is only drawn once a new tick is out
+        frame_time = 1.0 / args.fps if args.fps else 0.0
+        interpolate = not args.fps or args.fps > CONFIG['FPS']
+        next_frame = 0.0
+    shown_tick = 0
+    running = True
+
+    try:
+        while running:
+            game_over = snapshot.game_over if sim_thread else simulation.game.game_over
+            with profiler.section('events'):
+                events = pygame.event.get()
+            for event in events:
+                if event.type == pygame.QUIT:
+                    running = False
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_F3 and args.profile:
+                        profiler.overlay = not profiler.overlay
+                        if renderer:
+                            renderer.reset()
+                    if event.key == pygame.K_F5:
+                        simulation.post('save')
+                    elif event.key == pygame.K_F9:
+                        if recorder:
+                            # A recording is one unbroken input log per seed, so it cannot rewind
+                            print("Checkpoint restore is disabled while recording")
+                        else:
+                            simulation.post('restore')
+                            accumulator = 0.0
+                            if renderer:
+                                renderer.reset()
+                    elif game_over:
+                        if event.key == pygame.K_r:
+                            simulation.post('restart')
+                        elif event.key == pygame.K_q:
+                            running = False
+                    elif event.key == pygame.K_m:
+                        audio.toggle_mute('engine')
+            if not sim_thread:
+                # A frame may run no tick at all, so apply key commands straight away
+                simulation.run_commands()
+                game_over = simulation.game.game_over
+
+            direction = None
+            if not game_over:
+                keys = pygame.key.get_pressed()
+                if keys[pygame.K_LEFT]:
+                    direction = "left"
+                elif keys[pygame.K_RIGHT]:
+                    direction = "right"
+            simulation.input = (direction, probe.sample(direction, time.perf_counter()) if probe else 0)
+
+            if sim_thread:
+                if sim_thread.error:
+                    raise sim_thread.error
+                # Draw whatever tick was published last; physics keeps its own pace meanwhile
+                snapshot = buffer.latest()
+                now = time.perf_counter()
+                if now < next_frame or not (interpolate or snapshot.tick != shown_tick):
+                    # Keep reading input between frames, so steering reaches the next tick without waiting for a draw
+                    time.sleep(CONFIG['INPUT_POLL_INTERVAL'])
+                    continue
+                # Half a tick of slack keeps frames locked to ticks that arrive a little early
+                next_frame = now + frame_time - (0.0 if interpolate else tick / 2)
+                ticks = snapshot.tick - shown_tick
+                shown_tick = snapshot.tick
+                game_over = snapshot.game_over
+                with profiler.section('audio'):
+                    audio.drain(snapshot.time)
+                alpha = min(1.0, (time.perf_counter() - snapshot.published) / tick)
+                with profiler.section('draw'):
+                    view.draw(screen, snapshot, alpha, profiler)
+                with profiler.section('flip'):
+                    pygame.display.flip()
+            else:
+                # Run as many fixed physics ticks as the elapsed time covers, so slow
+                # frames catch up instead of slowing the game and fast ones just redraw
+                now = time.perf_counter()
+                accumulator += now - last_frame
+                last_frame = now
+                ticks = 0
+                while accumulator >= tick:
+                    if ticks == CONFIG['MAX_TICKS_PER_FRAME']:
+                        # Too far behind (a stall or a breakpoint): drop the time rather than spiral
+                        accumulator = 0.0
+                        break
+                    simulation.tick(tick)
+                    accumulator -= tick
+                    ticks += 1
+                game = simulation.game
+                shown_tick = simulation.ticks
+                game_over = game.game_over
+
+                with profiler.section('audio'):
+                    audio.drain(game.timer())
+                alpha = accumulator / tick
+                if renderer:
+                    renderer.render(game, alpha=alpha)
+                else:
+                    with profiler.section('draw'):
+                        game.draw(alpha=alpha)
+                    with profiler.section('flip'):
+                        pygame.display.flip()
+            if probe:
+                probe.displayed(shown_tick, time.perf_counter())
+            if capture or instant_replay:
+                with profiler.section('capture'):
+                    capture_time += ticks * tick
+                    # The crash frame is always kept, so the replay ends on it
+                    crashed = instant_replay is not None and game_over and not replay_saved
+                    if capture_time >= capture_interval or crashed:
+                        capture_time = max(0.0, min(capture_time - capture_interval, capture_interval))
+                        if capture:
+                            capture.grab(captured_frames)
+                        if instant_replay:
+                            instant_replay.grab(captured_frames)
+                        captured_frames += 1
+                    if crashed:
+                        instant_replay.dump()
+                        replay_saved = True
+                    elif not game_over:
+                        replay_saved = False
+            # The threaded loop paces itself, so its clock only measures
+            clock.tick(0 if sim_thread else args.fps)
+            profiler.end_frame(clock.get_fps())
+    finally:
+        if sim_thread:
+            sim_thread.stop()
+        # Flush even when the game crashes, so the log reproduces the crash
+        if recorder:
+            recorder.close()
+        if capture:
+            capture.close()
+        if instant_replay:
+            instant_replay.close()
+
+    if args.profile:
+        profiler.export(args.profile)
+    if args.latency:
+        probe.report()
+
+def main(args=None):
+    play(args or parse_args())
+    try:
+        pygame.quit()
+    except pygame.error as e:
+        print(f"Failed to quit Pygame: {e}")
+
+if __name__ == "__main__":
+    main()
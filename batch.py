@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Parallel headless batch runs for tuning CONFIG difficulty values.
+
+Every combination of the parameter grid is played for a number of seeded
+episodes with a scripted or random driving policy, spread over a process
+pool. Survival time, score distribution and crash causes are aggregated
+per combination and written to a JSON results file.
+
+Usage:
+    python batch.py --param OPPONENT_MIN_INTERVAL=0.5,1 --param TURN_SPEED=0.3,0.4 \
+        --policy avoid --episodes 200 --out results.json
+    python batch.py --grid grid.json --policy random,weave
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+# Set before Game is imported, so workers never open a window or the mixer
+os.environ.setdefault("SIMPLE_GAME_HEADLESS", "1")
+
+import Game
+from Game import CONFIG, ObjectType
+
+def idle_policy(seed):
+    return lambda game: None
+
+def random_policy(seed):
+    rng = random.Random(seed)
+    return lambda game: rng.choice(Game.DIRECTIONS)
+
+def weave_policy(seed, period=45):
+    """Hold each direction for `period` ticks, then switch."""
+    ticks = itertools.count()
+    return lambda game: "left" if next(ticks) // period % 2 else "right"
+
+def avoid_policy(seed, lookahead=250):
+    """Steer away from the nearest opponent or person ahead in the player's path."""
+    def policy(game):
+        player = game.player
+        nearest = None
+        hazards = itertools.chain(game.opponents, (obj for obj in game.environment if obj.type == ObjectType.PERSON))
+        for hazard in hazards:
+            gap = player.y - (hazard.y + hazard.height)
+            if -player.height < gap < lookahead and \
+                    hazard.x < player.x + player.width + 20 and player.x - 20 < hazard.x + hazard.width:
+                if nearest is None or gap < nearest[0]:
+                    nearest = (gap, hazard)
+        if nearest is None:
+            return None
+        hazard = nearest[1]
+        left_room = player.x - (CONFIG['ROAD_X'] + 20)
+        right_room = CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - 20 - (player.x + player.width)
+        if hazard.x + hazard.width / 2 > player.x + player.width / 2:
+            return "left" if left_room > 10 else "right"
+        return "right" if right_room > 10 else "left"
+    return policy
+
+POLICIES = {
+    'idle': idle_policy,
+    'random': random_policy,
+    'weave': weave_policy,
+    'avoid': avoid_policy,
+}
+
+def run_episode(task):
+    """Worker entry point: play one seeded episode with CONFIG overrides applied."""
+    combo, overrides, policy_name, seed, max_steps = task
+    saved = {key: CONFIG[key] for key in overrides}
+    CONFIG.update(overrides)
+    try:
+        game = Game.run_headless(POLICIES[policy_name](seed), seed=seed, max_steps=max_steps)
+    finally:
+        CONFIG.update(saved)
+    return {
+        'combo': combo,
+        'policy': policy_name,
+        'seed': seed,
+        'survival': game.timer(),
+        'score': game.score,
+        'cause': game.crash_cause or "timeout",
+    }
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, len(ordered) * p // 100)] if ordered else 0
+
+def summarize(results):
+    survival = [result['survival'] for result in results]
+    scores = [result['score'] for result in results]
+    causes = {}
+    histogram = {}
+    for result in results:
+        causes[result['cause']] = causes.get(result['cause'], 0) + 1
+        bucket = result['score'] // 500 * 500
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+    return {
+        'episodes': len(results),
+        'survival': {'mean': sum(survival) / len(survival), 'p50': percentile(survival, 50),
+                     'p95': percentile(survival, 95), 'max': max(survival)},
+        'score': {'mean': sum(scores) / len(scores), 'p50': percentile(scores, 50),
+                  'p95': percentile(scores, 95), 'max': max(scores),
+                  'histogram': {str(bucket): histogram[bucket] for bucket in sorted(histogram)}},
+        'causes': causes,
+    }
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def build_grid(args):
+    grid = {}
+    if args.grid:
+        with open(args.grid) as f:
+            grid.update(json.load(f))
+    for param in args.param:
+        key, _, values = param.partition("=")
+        grid[key] = [parse_value(value) for value in values.split(",")]
+    unknown = [key for key in grid if key not in CONFIG]
+    if unknown:
+        raise SystemExit(f"Unknown CONFIG keys in grid: {', '.join(unknown)}")
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run seeded headless Simple Game episodes over a CONFIG grid")
+    parser.add_argument("--grid", help="JSON file mapping CONFIG keys to lists of values")
+    parser.add_argument("--param", action="append", default=[], metavar="KEY=V1,V2",
+                        help="CONFIG key and comma-separated values to sweep (repeatable)")
+    parser.add_argument("--policy", default="avoid",
+                        help=f"comma-separated driving policies: {', '.join(POLICIES)}")
+    parser.add_argument("--episodes", type=int, default=100, help="episodes per combination and policy")
+    parser.add_argument("--seed", type=int, default=0, help="first episode seed")
+    parser.add_argument("--max-steps", type=int, default=CONFIG['FPS'] * 300, help="tick limit per episode")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--out", default="batch_results.json", help="results file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    policies = [name.strip() for name in args.policy.split(",") if name.strip()]
+    for name in policies:
+        if name not in POLICIES:
+            raise SystemExit(f"Unknown policy {name!r}; choose from {', '.join(POLICIES)}")
+    combos = build_grid(args)
+    tasks = [(combo, overrides, policy, args.seed + episode, args.max_steps)
+             for combo, overrides in enumerate(combos)
+             for policy in policies
+             for episode in range(args.episodes)]
+
+    start = time.perf_counter()
+    results = {}
+    # Several episodes per message keeps IPC overhead small next to the simulation itself
+    chunksize = max(1, len(tasks) // (args.workers * 8))
+    with multiprocessing.Pool(args.workers) as pool:
+        for result in pool.imap_unordered(run_episode, tasks, chunksize):
+            results.setdefault((result['combo'], result['policy']), []).append(result)
+    elapsed = time.perf_counter() - start
+
+    summaries = []
+    for (combo, policy), episodes in sorted(results.items()):
+        summary = summarize(episodes)
+        summary.update(params=combos[combo], policy=policy)
+        summaries.append(summary)
+        print(f"{policy:>7} {json.dumps(combos[combo])}: survival p50 {summary['survival']['p50']:.1f}s, "
+              f"score mean {summary['score']['mean']:.0f}, causes {summary['causes']}")
+    ticks = sum(result['survival'] for episodes in results.values() for result in episodes) * CONFIG['FPS']
+    print(f"{len(tasks)} episodes on {args.workers} workers in {elapsed:.1f}s ({ticks / elapsed:.0f} ticks/s)")
+
+    with open(args.out, "w") as f:
+        json.dump({'workers': args.workers, 'seconds': elapsed, 'episodes': len(tasks), 'results': summaries}, f, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmarks and fixed-seed gameplay scenarios for the game's hot paths.
+
+Runs headless; usage:
+    python bench.py [spatial entities alloc scenarios ...]
+    python bench.py scenarios --save-baseline bench_baseline.json
+    python bench.py scenarios --baseline bench_baseline.json   # exits 1 on a regression
+"""
+import argparse
+import bisect
+import collections
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SIMPLE_GAME_HEADLESS", "1")
+
+import pygame
+import Game
+from Game import CONFIG, WIDTH, HEIGHT, EnvironmentObject, ObjectType
+
+OBJECT_COUNTS = (25, 100, 200, 400, 800)
+
+def make_game(extra_objects, seed=0, backend="python", trees=True):
+    """Build a headless game with extra barriers and, optionally, roadside trees mixed in."""
+    CONFIG['ENTITY_BACKEND'] = backend
+    game = Game.Game(seed=seed, timer=Game.SimClock(), headless=True)
+    rng = game.rng
+    for i in range(extra_objects):
+        if i % 2 or not trees:
+            x = rng.randint(CONFIG['ROAD_X'] + 20, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] - CONFIG['BARRIER_WIDTH'] - 20)
+            obj = game.object_class(x, rng.randint(-HEIGHT, HEIGHT * 2), Game.assets.image('barrier'), ObjectType.BARRIER)
+        else:
+            x = rng.choice([CONFIG['ROAD_X'] - CONFIG['TREE_WIDTH'] - 30, CONFIG['ROAD_X'] + CONFIG['ROAD_WIDTH'] + 30])
+            obj = game.object_class(x, rng.randint(-HEIGHT, HEIGHT * 2), Game.assets.image('tree'), ObjectType.TREE)
+        game.add_environment_object(obj)
+    game.player.speed = 10
+    return game
+
+def linear_collisions(game):
+    """The pre-index check_collisions scan, kept as the reference cost."""
+    player = game.player
+    player_rect = pygame.Rect(player.x, player.y, player.width, player.height)
+    for opponent in game.opponents:
+        if player_rect.colliderect(pygame.Rect(opponent.x, opponent.y, opponent.width, opponent.height)):
+            return True
+    for obj in game.environment:
+        if player_rect.colliderect(obj.get_rect()):
+            return True
+    return False
+
+def linear_overlap(game, new_obj):
+    """The pre-index check_overlap scan over a freshly filtered list."""
+    new_rect = pygame.Rect(new_obj.x, new_obj.y, new_obj.width, new_obj.height)
+    for obj in [o for o in game.environment if o.type in [ObjectType.TREE, ObjectType.FLAG]]:
+        if obj is not new_obj and new_rect.colliderect(obj.get_rect()):
+            return True
+    return False
+
+def timeit(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def bench_spatial(repeat=2000):
+    """Collision and placement query cost against object count, grid vs linear scan."""
+    print(f"{'objects':>8} {'collide grid':>13} {'collide scan':>13} {'place grid':>11} {'place scan':>11} {'frame':>9}  (us)")
+    saved_backend = CONFIG['ENTITY_BACKEND']
+    try:
+        for count in OBJECT_COUNTS:
+            game = make_game(count)
+            probe = EnvironmentObject(CONFIG['ROAD_X'] - CONFIG['TREE_WIDTH'] - 30, -100, Game.assets.image('tree'), ObjectType.TREE)
+
+            def collide():
+                game.check_collisions()
+                game.game_over = False
+
+            def frame():
+                game.update()
+                game.game_over = False
+
+            print(f"{len(game.environment):>8} "
+                  f"{timeit(collide, repeat):>13.2f} "
+                  f"{timeit(lambda: linear_collisions(game), repeat):>13.2f} "
+                  f"{timeit(lambda: game.check_overlap(probe), repeat):>11.2f} "
+                  f"{timeit(lambda: linear_overlap(game, probe), repeat):>11.2f} "
+                  f"{timeit(frame, repeat // 10):>9.2f}")
+    finally:
+        CONFIG['ENTITY_BACKEND'] = saved_backend
+
+def bench_collisions(repeat=2000, frames=600):
+    """check_collisions cost of the rect-only path against the mask narrow phase.
+
+    In the "near" columns a person and an opponent sit diagonally against
+    the player's box, so the narrow phase runs on every call. The scenario
+    rows compare the check_collisions phase over whole gameplay runs.
+    """
+    print(f"{'objects':>8} {'rect':>7} {'pixel':>7} {'ratio':>6} {'rect near':>10} {'pixel near':>11} {'ratio':>6}  (us)")
+    pixel_collisions = CONFIG['PIXEL_COLLISIONS']
+    saved_backend = CONFIG['ENTITY_BACKEND']
+    try:
+        for count in OBJECT_COUNTS:
+            game = make_game(count)
+            player = game.player
+
+            def collide():
+                game.check_collisions()
+                game.game_over = False
+
+            row = []
+            for near in (False, True):
+                if near:
+                    person = Game.assets.image('person')
+                    game.add_environment_object(game.object_class(
+                        player.x + player.width - 2, player.y - person.get_height() + 2, person, ObjectType.PERSON))
+                    car = game.opponents.acquire(player.x - CONFIG['CAR_WIDTH'] + 2, player.y - CONFIG['CAR_HEIGHT'] + 2, 0)
+                    game.index.insert(car)
+                for pixel in (False, True):
+                    CONFIG['PIXEL_COLLISIONS'] = pixel
+                    row.append(timeit(collide, repeat))
+            print(f"{len(game.environment):>8} {row[0]:>7.2f} {row[1]:>7.2f} {row[1] / row[0]:>6.2f} "
+                  f"{row[2]:>10.2f} {row[3]:>11.2f} {row[3] / row[2]:>6.2f}")
+
+        print(f"{'scenario':>8} {'rect':>7} {'pixel':>7} {'ratio':>6}  (check_collisions us/frame)")
+        for name in SCENARIOS:
+            row = []
+            for pixel in (False, True):
+                CONFIG['PIXEL_COLLISIONS'] = pixel
+                row.append(run_scenario(name, frames)['phases']['check_collisions'])
+            print(f"{name:>8} {row[0]:>7.2f} {row[1]:>7.2f} {row[1] / row[0]:>6.2f}")
+    finally:
+        CONFIG['PIXEL_COLLISIONS'] = pixel_collisions
+        CONFIG['ENTITY_BACKEND'] = saved_backend
+
+def bench_entities(repeat=300):
+    """Per-frame update cost of the python and NumPy entity backends against object count."""
+    backends = ["python"] + (["numpy"] if Game.np is not None else [])
+    print(f"{'objects':>8} " + " ".join(f"{name:>9}" for name in backends) + "  (us/frame)")
+    saved_backend = CONFIG['ENTITY_BACKEND']
+    try:
+        for count in OBJECT_COUNTS:
+            row = []
+            for backend in backends:
+                # Barriers only, so placement retries for crowded roadside lanes don't swamp the scroll cost
+                game = make_game(count, backend=backend, trees=False)
+                # Opponents spawn on every update so the traffic path is exercised too
+                game.opponent_interval = 0
+
+                def frame():
+                    game.update()
+                    game.game_over = False
+
+                row.append(timeit(frame, repeat))
+            print(f"{len(game.environment):>8} " + " ".join(f"{us:>9.2f}" for us in row))
+    finally:
+        CONFIG['ENTITY_BACKEND'] = saved_backend
+
+def new_survivors(func):
+    """Run func and count GC-tracked objects created by it that are still alive afterwards.
+
+    Holding references to every pre-existing object stops their addresses from
+    being reused, so an id not seen before is a genuinely new object.
+    """
+    before = gc.get_objects()
+    known = set(map(id, before))
+    known.add(id(before))
+    known.add(id(known))
+    func()
+    after = gc.get_objects()
+    known.add(id(after))
+    return sum(1 for obj in after if id(obj) not in known)
+
+def bench_alloc(frames=1000, warmup=2000):
+    """Steady-state traffic: objects allocated per frame that outlive the frame, and GC runs."""
+    backends = ["python"] + (["numpy"] if Game.np is not None else [])
+    collections = [0]
+
+    def on_gc(phase, info):
+        if phase == "start":
+            collections[0] += 1
+
+    print(f"{'backend':>8} {'frames':>7} {'new objects/frame':>18} {'collections':>12} {'max active':>11}")
+    # Dense traffic: a spawn every 0.1s once the score has driven the interval down
+    min_interval = CONFIG['OPPONENT_MIN_INTERVAL']
+    saved_backend = CONFIG['ENTITY_BACKEND']
+    CONFIG['OPPONENT_MIN_INTERVAL'] = 0.1
+    try:
+        for backend in backends:
+            game = make_game(0, backend=backend, trees=False)
+
+            def step():
+                game.step("left")
+                game.game_over = False
+
+            for _ in range(warmup):
+                step()
+            active = 0
+            created = 0
+            gc.collect()
+            collections[0] = 0
+            gc.callbacks.append(on_gc)
+            try:
+                for _ in range(frames):
+                    created += new_survivors(step)
+                    active = max(active, len(game.opponents))
+            finally:
+                gc.callbacks.remove(on_gc)
+            print(f"{backend:>8} {frames:>7} {created / frames:>18.3f} {collections[0]:>12} {active:>11}")
+    finally:
+        CONFIG['ENTITY_BACKEND'] = saved_backend
+        CONFIG['OPPONENT_MIN_INTERVAL'] = min_interval
+
+def weave(game, i, period=30):
+    return "left" if i // period % 2 else "right"
+
+# Scenario name -> seed, extra environment objects, pinned player speed, steering,
+# starting score and CONFIG overrides
+SCENARIOS = {
+    'idle': {'seed': 1, 'objects': 0, 'speed': 8, 'steer': None},
+    'weave': {'seed': 2, 'objects': 0, 'speed': CONFIG['MAX_SPEED'], 'steer': weave},
+    'dense': {'seed': 3, 'objects': 0, 'speed': CONFIG['MAX_SPEED'], 'steer': weave, 'score': 3000,
+              'config': {'OPPONENT_MIN_INTERVAL': 0.1}},
+    'stress': {'seed': 4, 'objects': 400, 'speed': 10, 'steer': weave},
+}
+
+# Absolute slack (us/frame) on top of the tolerance, so jitter in the cheapest phases does not fail the gate
+PHASE_SLACK_US = 2.0
+
+def run_scenario(name, frames=600, warmup=120):
+    """Play a scenario through Game.step() and Game.draw() on an off-screen surface.
+
+    Collisions are still checked every frame, but game over is cleared so
+    every run has the same length. Returns frames per second and the mean
+    time of each profiler phase in microseconds.
+    """
+    spec = SCENARIOS[name]
+    overrides = spec.get('config', {})
+    saved = {key: CONFIG[key] for key in overrides}
+    CONFIG.update(overrides)
+    try:
+        game = make_game(spec['objects'], seed=spec['seed'])
+        game.score = spec.get('score', 0)
+        surface = pygame.Surface((WIDTH, HEIGHT))
+        profiler = Game.Profiler(window=frames)
+        steer = spec['steer']
+        # As timeit does, keep collector pauses from landing in whichever phase happens to trigger them
+        gc.collect()
+        gc.disable()
+        for i in range(warmup + frames):
+            if i == warmup:
+                game.profiler = profiler
+                start = time.perf_counter()
+            game.player.speed = spec['speed']
+            game.step(steer(game, i) if steer else None)
+            game.game_over = False
+            with game.profiler.section('draw'):
+                game.draw(surface)
+            game.profiler.end_frame()
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+        CONFIG.update(saved)
+    phases = {}
+    for frame in profiler.frames:
+        for phase, ms in frame.items():
+            phases[phase] = phases.get(phase, 0) + ms
+    return {'ops': frames / elapsed, 'phases': {phase: ms * 1000 / frames for phase, ms in phases.items()}}
+
+def compare(results, baseline, tolerance):
+    """Return a message for every scenario or phase that is slower than the baseline allows."""
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['ops'] < base['ops'] * (1 - tolerance):
+            failures.append(f"{name}: {result['ops']:.0f} ops/s, baseline {base['ops']:.0f}")
+        for phase, us in sorted(result['phases'].items()):
+            base_us = base['phases'].get(phase)
+            if base_us is not None and us > base_us * (1 + tolerance) + PHASE_SLACK_US:
+                failures.append(f"{name}.{phase}: {us:.1f}us, baseline {base_us:.1f}us")
+    return failures
+
+def bench_scenarios(names=None, frames=600, repeat=3, baseline=None, save_baseline=None, tolerance=0.25):
+    """Fixed-seed gameplay scenarios with update and draw; returns the regressions against baseline."""
+    names = names or list(SCENARIOS)
+    params = {'frames': frames, 'repeat': repeat}
+    # Best of interleaved runs, so one noisy stretch does not fail the gate or skew a single scenario
+    runs = {name: [] for name in names}
+    saved_backend = CONFIG['ENTITY_BACKEND']
+    try:
+        for _ in range(repeat):
+            for name in names:
+                runs[name].append(run_scenario(name, frames))
+    finally:
+        CONFIG['ENTITY_BACKEND'] = saved_backend
+    results = {}
+    for name in names:
+        phases = {phase: min(run['phases'].get(phase, 0) for run in runs[name]) for phase in runs[name][0]['phases']}
+        results[name] = {'ops': max(run['ops'] for run in runs[name]), 'phases': phases}
+        print(f"{name:>8} {results[name]['ops']:>9.0f} ops/s  " +
+              "  ".join(f"{phase} {us:.1f}" for phase, us in sorted(phases.items())) + "  (us/frame)")
+
+    if save_baseline:
+        with open(save_baseline, "w") as f:
+            json.dump({'params': params, 'scenarios': results}, f, indent=2)
+        print(f"Saved baseline to {save_baseline}")
+    if not baseline:
+        return []
+    try:
+        with open(baseline) as f:
+            saved = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Failed to read baseline {baseline}: {e}")
+        return [f"unreadable baseline {baseline}"]
+    # Timings from runs of a different length or best-of count are not comparable
+    if not isinstance(saved, dict) or saved.get('params') != params:
+        recorded = saved.get('params') if isinstance(saved, dict) else None
+        print(f"Refusing to compare against {baseline}: it was recorded with {recorded or 'unknown parameters'}, "
+              f"this run uses {params}. Re-run with matching --frames/--repeat or save a new baseline.")
+        return [f"mismatched baseline {baseline}"]
+    failures = compare(results, saved['scenarios'], tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if not failures:
+        print(f"No regressions against {baseline} (tolerance {tolerance:.0%})")
+    return failures
+
+# Scripted steering for bench_latency: every change lasts longer than any injected stall
+LATENCY_STEERING = (None, pygame.K_LEFT, None, pygame.K_RIGHT)
+
+def run_latency(threaded, seconds, stall_every, stall, hold=(0.08, 0.12)):
+    """Play the real main loop with scripted keys and stalling flips; returns LatencyProbe.summary().
+
+    Presses are spaced a random hold apart, so they fall at any point of
+    a tick. Key state only changes when events are pumped, as SDL's does,
+    and delays are measured from the scripted press, so time spent waiting
+    for the render loop to look at the keyboard counts. Crashes are
+    switched off, so the whole run is spent driving.
+    """
+    rng = random.Random(0)
+    keys = {}
+    frames = [0]
+    presses = []
+    real_get, real_pressed = pygame.event.get, pygame.key.get_pressed
+    real_flip, real_end = pygame.display.flip, Game.Game.end
+
+    def get_events():
+        now = time.perf_counter()
+        if not presses:
+            press = now
+            while press < now + seconds:
+                press += rng.uniform(*hold)
+                presses.append(press)
+        key = LATENCY_STEERING[bisect.bisect(presses, now) % len(LATENCY_STEERING)]
+        keys.clear()
+        if key is not None:
+            keys[key] = True
+        events = real_get()
+        if now > presses[-1]:
+            events.append(pygame.event.Event(pygame.QUIT))
+        return events
+
+    def flip():
+        real_flip()
+        frames[0] += 1
+        if stall_every and frames[0] % stall_every == 0:
+            time.sleep(stall)
+
+    pygame.event.get = get_events
+    pygame.key.get_pressed = lambda: collections.defaultdict(bool, keys)
+    pygame.display.flip = flip
+    Game.Game.end = lambda game, cause: None
+    probe = Game.LatencyProbe()
+    try:
+        Game.play(Game.parse_args(["--seed", "0", "--fps", "60"] + (["--threaded"] if threaded else [])), probe)
+    finally:
+        pygame.event.get, pygame.key.get_pressed = real_get, real_pressed
+        pygame.display.flip, Game.Game.end = real_flip, real_end
+    return probe.summary(presses)
+
+def bench_latency(seconds=6.0, stall_every=10, stall=0.05):
+    """Steering latency and tick spacing of the single-threaded and --threaded loops, with and without stalled flips."""
+    print(f"{'loop':>8} {'stalls':>7} {'press->tick p50/p99/max':>24} {'press->frame p50/p99/max':>25} "
+          f"{'tick gap p50/p99/max':>21}  (ms)")
+    for every in (0, stall_every):
+        for threaded in (False, True):
+            result = run_latency(threaded, seconds, every, stall)
+            stalls = f"1/{every}" if every else "none"
+            print(f"{'threaded' if threaded else 'single':>8} {stalls:>7} " +
+                  " ".join(f"{'/'.join(f'{ms:.1f}' for ms in result[name]):>24}"
+                           for name in ('input_to_tick', 'input_to_frame', 'tick_interval')))
+
+BENCHMARKS = {
+    'spatial': bench_spatial,
+    'collisions': bench_collisions,
+    'entities': bench_entities,
+    'alloc': bench_alloc,
+    'scenarios': bench_scenarios,
+    'latency': bench_latency,
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Simple Game's hot paths headlessly")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="run only this scenario (repeatable)")
+    parser.add_argument("--frames", type=int, default=600, help="measured frames per scenario run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; the best one counts")
+    parser.add_argument("--baseline", metavar="PATH", help="scenario baseline JSON to compare against")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the scenario results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Unknown benchmarks {', '.join(unknown)}; choose from {', '.join(BENCHMARKS)}")
+    # A (dummy, when headless) display lets sprites be converted to the screen format as in the game
+    Game.init_display()
+    failures = []
+    for name in args.names or BENCHMARKS:
+        print(f"== {name}")
+        if name == 'scenarios':
+            failures += bench_scenarios(args.scenario, args.frames, args.repeat,
+                                        args.baseline, args.save_baseline, args.tolerance)
+        else:
+            BENCHMARKS[name]()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
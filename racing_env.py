@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Gym-style reset/step environments around the headless game, for training driving agents.
+
+Actions follow Car.move(): 0 = straight, 1 = left, 2 = right. By default
+observations are flat float vectors: the player's state, then the
+nearest opponents and the nearest on-road objects relative to the
+player. With pixels=True the frame is drawn to an off-screen surface
+instead.
+
+    env = RacingEnv(seed=0)
+    obs = env.reset()
+    obs, reward, done, info = env.step(1)
+
+VectorRacingEnv steps N games in lockstep in one process and resets
+finished games automatically.
+"""
+import os
+
+os.environ.setdefault("SIMPLE_GAME_HEADLESS", "1")
+
+import pygame
+import Game
+from Game import CONFIG, WIDTH, HEIGHT, ObjectType, np
+
+NEAREST_OPPONENTS = 3
+NEAREST_OBJECTS = 4
+PLAYER_FEATURES = 3
+OPPONENT_FEATURES = 4
+OBJECT_FEATURES = 5
+OBSERVATION_SIZE = PLAYER_FEATURES + NEAREST_OPPONENTS * OPPONENT_FEATURES + NEAREST_OBJECTS * OBJECT_FEATURES
+
+class RacingEnv:
+    """One game behind a reset()/step() interface.
+
+    The reward is the score gained this step divided by 100, plus
+    alive_reward for each step survived, plus crash_penalty when the game
+    ends. An episode ends on game over or after max_steps steps.
+    """
+    def __init__(self, seed=None, max_steps=CONFIG['FPS'] * 120, pixels=False, pixel_size=None,
+                 alive_reward=0.0, crash_penalty=-1.0):
+        self.seed = seed
+        self.max_steps = max_steps
+        self.pixels = pixels
+        self.pixel_size = pixel_size
+        self.alive_reward = alive_reward
+        self.crash_penalty = crash_penalty
+        self.surface = None
+        self.scaled = None
+        self.game = None
+        self.steps = 0
+        self.episodes = 0
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed = seed
+        # Each reset gets a fresh but reproducible seed
+        episode_seed = None if self.seed is None else self.seed + self.episodes
+        self.episodes += 1
+        self.game = Game.Game(seed=episode_seed, timer=Game.SimClock(), headless=True)
+        self.steps = 0
+        return self.observe()
+
+    def step(self, action):
+        reward, done, info = self.advance(action)
+        return self.observe(), reward, done, info
+
+    def advance(self, action):
+        """Step the game without observing it; returns (reward, done, info)."""
+        game = self.game
+        score = game.score
+        game.step(Game.DIRECTIONS[action])
+        self.steps += 1
+        reward = (game.score - score) / 100 + self.alive_reward
+        if game.game_over:
+            reward += self.crash_penalty
+        done = game.game_over or self.steps >= self.max_steps
+        return reward, done, {'score': game.score, 'steps': self.steps, 'crash_cause': game.crash_cause}
+
+    def observe(self):
+        if self.pixels:
+            return self.render_pixels()
+        return observe_state(self.game)
+
+    def render_pixels(self):
+        """Draw the frame off-screen and return it as an (height, width, 3) array."""
+        if self.surface is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self.surface = pygame.Surface((WIDTH, HEIGHT))
+            if self.pixel_size:
+                self.scaled = pygame.Surface(self.pixel_size)
+        self.game.draw(self.surface)
+        surface = self.surface
+        if self.scaled is not None:
+            pygame.transform.scale(self.surface, self.pixel_size, self.scaled)
+            surface = self.scaled
+        return pygame.surfarray.array3d(surface).swapaxes(0, 1)
+
+def observe_state(game, out=None):
+    """Fill out (or a new vector) with the game's state features.
+
+    Positions are relative to the player and scaled by the screen size;
+    missing opponents and objects are zero rows with their present flag off.
+    """
+    # Features are gathered in a list and copied into out in one go; per-element
+    # writes into a NumPy array cost more than the rest of the function
+    features = [0.0] * OBSERVATION_SIZE
+    player = game.player
+    px = player.x + player.width / 2
+    py = player.y + player.height / 2
+    features[0] = (player.x - CONFIG['ROAD_X']) / CONFIG['ROAD_WIDTH']
+    features[1] = player.speed / CONFIG['MAX_SPEED']
+    features[2] = player.angle / 15
+
+    # Everything on the road between the top of the spawn area and the bottom of the screen.
+    # There are only a few dozen entities, so a straight scan beats a spatial index query
+    # over this many cells.
+    left = CONFIG['ROAD_X']
+    right = left + CONFIG['ROAD_WIDTH']
+    top = -HEIGHT
+    bottom = HEIGHT
+    opponents = []
+    objects = []
+    for car in game.opponents:
+        x = car.x
+        y = car.y
+        if x < right and left < x + car.width and y < bottom and top < y + car.height:
+            dx = (x + car.width / 2 - px) / WIDTH
+            dy = (y + car.height / 2 - py) / HEIGHT
+            opponents.append((dx * dx + dy * dy, dx, dy, car.speed / CONFIG['MAX_SPEED']))
+    for obj in game.environment:
+        obj_type = obj.type
+        if obj_type is not ObjectType.BARRIER and obj_type is not ObjectType.PERSON:
+            continue
+        x = obj.x
+        y = obj.y
+        if x < right and left < x + obj.width and y < bottom and top < y + obj.height:
+            dx = (x + obj.width / 2 - px) / WIDTH
+            dy = (y + obj.height / 2 - py) / HEIGHT
+            objects.append((dx * dx + dy * dy, dx, dy, obj_type is ObjectType.BARRIER, obj_type is ObjectType.PERSON))
+    opponents.sort()
+    objects.sort()
+
+    base = PLAYER_FEATURES
+    for _, dx, dy, speed in opponents[:NEAREST_OPPONENTS]:
+        features[base:base + OPPONENT_FEATURES] = dx, dy, speed, 1.0
+        base += OPPONENT_FEATURES
+    base = PLAYER_FEATURES + NEAREST_OPPONENTS * OPPONENT_FEATURES
+    for _, dx, dy, barrier, person in objects[:NEAREST_OBJECTS]:
+        features[base:base + OBJECT_FEATURES] = dx, dy, float(barrier), float(person), 1.0
+        base += OBJECT_FEATURES
+    if out is None:
+        return np.array(features, dtype=np.float32) if np is not None else features
+    out[:] = features
+    return out
+
+class VectorRacingEnv:
+    """N games stepped in lockstep in one process.
+
+    step() takes one action per game and returns stacked observations,
+    rewards and done flags. A finished game is reset straight away, and its
+    last observation is kept in info['final_observation'].
+
+    Every call returns new arrays, so callers may keep them (in a replay
+    buffer, say). With copy=False the same arrays are returned each time
+    and overwritten in place by the next call.
+    """
+    def __init__(self, num_envs, seed=0, copy=True, **kwargs):
+        self.envs = [RacingEnv(seed=None if seed is None else seed + i * 1000003, **kwargs) for i in range(num_envs)]
+        self.num_envs = num_envs
+        self.copy = copy
+        self.pixels = kwargs.get('pixels', False)
+        self.observations = None
+        if np is not None and not self.pixels:
+            self.observations = np.zeros((num_envs, OBSERVATION_SIZE), dtype=np.float32)
+            self.rewards = np.zeros(num_envs, dtype=np.float32)
+            self.dones = np.zeros(num_envs, dtype=np.bool_)
+
+    def reset(self):
+        if self.observations is None:
+            return self._stack([env.reset() for env in self.envs])
+        for i, env in enumerate(self.envs):
+            env.reset()
+            observe_state(env.game, self.observations[i])
+        return self.observations.copy() if self.copy else self.observations
+
+    def step(self, actions):
+        if self.observations is None:
+            results = [env.step(action) for env, action in zip(self.envs, actions)]
+            infos = [result[3] for result in results]
+            observations = []
+            for i, (observation, reward, done, info) in enumerate(results):
+                if done:
+                    info['final_observation'] = observation
+                    observation = self.envs[i].reset()
+                observations.append(observation)
+            return self._stack(observations), [r[1] for r in results], [r[2] for r in results], infos
+
+        infos = []
+        for i, env in enumerate(self.envs):
+            reward, done, info = env.advance(actions[i])
+            if done:
+                info['final_observation'] = observe_state(env.game)
+                env.reset()
+            observe_state(env.game, self.observations[i])
+            self.rewards[i] = reward
+            self.dones[i] = done
+            infos.append(info)
+        if self.copy:
+            return self.observations.copy(), self.rewards.copy(), self.dones.copy(), infos
+        return self.observations, self.rewards, self.dones, infos
+
+    def _stack(self, observations):
+        return np.stack(observations) if np is not None else observations
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Fast-forward replay of input logs written by `python Game.py --record PATH`.
+
+Every recorded game is re-run headless through Game.step() at full CPU
+speed. Selected frames can be rendered to PNG for bug reports.
+
+Usage: python replay.py run.rec [more.rec ...] [--frames 0,120,-1 --out frames/]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("SIMPLE_GAME_HEADLESS", "1")
+
+import pygame
+import Game
+
+def replay_game(seed, frames, render_frames=(), out_dir=None, prefix="game"):
+    """Re-run one recorded game and return it in its final state.
+
+    render_frames holds frame numbers (negative counts from the end) to
+    draw off-screen and save as PNG files in out_dir.
+    """
+    render_frames = {i if i >= 0 else len(frames) + i for i in render_frames}
+    surface = pygame.Surface((Game.WIDTH, Game.HEIGHT)) if render_frames else None
+    game = Game.Game(seed=seed, timer=Game.SimClock(), headless=True)
+    for i, (direction, dt) in enumerate(frames):
+        game.step(direction, dt)
+        if i in render_frames:
+            game.draw(surface)
+            pygame.image.save(surface, os.path.join(out_dir or ".", f"{prefix}_{i:06d}.png"))
+    return game
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded Simple Game sessions headlessly")
+    parser.add_argument("logs", nargs="+", help="recordings written with Game.py --record")
+    parser.add_argument("--frames", default="",
+                        help="comma-separated frame numbers to render, negative counts from the end")
+    parser.add_argument("--out", default=".", help="directory for rendered frames")
+    parser.add_argument("--track", choices=Game.Recorder.TRACK_MODES, default=None,
+                        help="track mode of version 1 and 2 recordings, which do not store it; "
+                             "newer recordings are checked against it")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    default_track = Game.CONFIG['TRACK_MODE']
+    pixel_collisions = Game.CONFIG['PIXEL_COLLISIONS']
+    render_frames = [int(frame) for frame in args.frames.split(",") if frame.strip()]
+    if render_frames:
+        os.makedirs(args.out, exist_ok=True)
+
+    total_frames = 0
+    start = time.perf_counter()
+    for path in args.logs:
+        try:
+            fps, settings, games = Game.read_recording(path)
+        except (OSError, ValueError, Game.struct.error) as e:
+            print(f"Failed to read recording {path}: {e}")
+            continue
+        track = settings.get('TRACK_MODE', args.track or default_track)
+        if args.track and args.track != track:
+            print(f"Failed to replay {path}: it was recorded with --track {track}, not --track {args.track}")
+            continue
+        Game.CONFIG['TRACK_MODE'] = track
+        Game.CONFIG['PIXEL_COLLISIONS'] = settings.get('PIXEL_COLLISIONS', pixel_collisions)
+        name = os.path.splitext(os.path.basename(path))[0]
+        for number, (seed, frames) in enumerate(games):
+            game = replay_game(seed, frames, render_frames, args.out, f"{name}_{number}")
+            total_frames += len(frames)
+            print(f"{path} game {number}: seed={seed} frames={len(frames)} "
+                  f"score={game.score} game_over={game.game_over} time={game.timer():.2f}s")
+    elapsed = time.perf_counter() - start
+    if elapsed > 0:
+        print(f"replayed {total_frames} frames in {elapsed:.2f}s ({total_frames / elapsed:.0f} frames/s)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
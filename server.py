@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+"""Networked races: an authoritative headless simulation broadcast to clients over TCP.
+
+The server steps one Game per seat in lockstep, all from the same seed,
+so head-to-head drivers race on the same track. The first clients to
+connect drive the seats; everyone after them spectates. Drivers send one
+byte whenever their direction changes. Every tick the server encodes
+one delta of the quantized player, opponent and scenery state. That cost
+does not depend on the number of clients, and the same bytes go to every
+client that is in sync. New or lagging clients get a full keyframe
+instead. Clients only draw what they receive.
+
+Usage:
+    python server.py [--port 8765 --seats 2 --seed N]   # run a race server
+    python server.py --connect 127.0.0.1:8765            # windowed client
+    python server.py --selftest --clients 40             # loopback test
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import struct
+import sys
+import time
+
+# The server and self-test never open a window; --connect runs a windowed client
+if "--connect" not in sys.argv:
+    os.environ.setdefault("SIMPLE_GAME_HEADLESS", "1")
+
+import pygame
+import Game
+from Game import CONFIG, WIDTH, HEIGHT, ObjectType, DIRECTIONS, DIRECTION_CODES
+
+# Message kinds, server to client
+WELCOME, KEYFRAME, DELTA = 0, 1, 2
+# Client to server input byte that restarts the driver's finished game; other bytes are direction codes
+RESTART = 255
+SPECTATOR = 255
+
+LENGTH = struct.Struct("<I")
+WELCOME_MESSAGE = struct.Struct("<BBB")  # kind, seat (or SPECTATOR), seats
+FRAME = struct.Struct("<BIB")  # kind, tick, seats
+SEAT = struct.Struct("<BdII")  # seat, scroll offset, changed entities, removed entities
+PLAYER = struct.Struct("<fffI?")  # x, angle, speed, score, game over
+ENTITY = struct.Struct("<IBhi")  # id, kind, x, y
+
+# Entity kind 0 is an opponent car at screen coordinates; scenery is at track
+# coordinates (screen y minus the scroll offset), which stay put while it scrolls
+OPPONENT = 0
+KINDS = {obj_type: kind for kind, obj_type in enumerate(ObjectType, 1)}
+KIND_TYPES = {kind: obj_type for obj_type, kind in KINDS.items()}
+
+def frame(body):
+    return LENGTH.pack(len(body)) + body
+
+def quantize(value):
+    # Rounded like Car.sprite(), so python floats and NumPy scalars give the same int
+    return math.floor(value + 0.5)
+
+class SeatEncoder:
+    """Quantized state of one seat's game and what changed since the previous tick.
+
+    Entity ids are handed out per object and never reused, so a restarted
+    game's objects show up as removals and additions.
+    """
+    def __init__(self, next_id=0):
+        self.ids = {}
+        self.next_id = next_id
+        self.entities = {}
+        self.player = None
+        self.scrolled = 0.0
+
+    def reset(self):
+        self.ids = {}
+
+    def _id(self, obj):
+        entity_id = self.ids.get(obj)
+        if entity_id is None:
+            entity_id = self.ids[obj] = self.next_id
+            self.next_id += 1
+        return entity_id
+
+    def update(self, game):
+        """Quantize the game's state and return (changed, removed) against the last update."""
+        player = game.player
+        self.player = (player.x, player.angle, player.speed, game.score, game.game_over)
+        self.scrolled = scrolled = game.lanes.scrolled
+        current = {}
+        for car in game.opponents:
+            current[self._id(car)] = (OPPONENT, quantize(car.x), quantize(car.y))
+        for obj in game.environment:
+            current[self._id(obj)] = (KINDS[obj.type], quantize(obj.x), quantize(obj.y - scrolled))
+        previous = self.entities
+        changed = [(entity_id, entity) for entity_id, entity in current.items() if previous.get(entity_id) != entity]
+        removed = [entity_id for entity_id in previous if entity_id not in current]
+        self.entities = current
+        return changed, removed
+
+    def pack(self, seat, changed, removed):
+        parts = [SEAT.pack(seat, self.scrolled, len(changed), len(removed)), PLAYER.pack(*self.player)]
+        parts.extend(ENTITY.pack(entity_id, *entity) for entity_id, entity in changed)
+        parts.append(struct.pack(f"<{len(removed)}I", *removed))
+        return b"".join(parts)
+
+class RemoteClient:
+    __slots__ = ('writer', 'seat', 'synced')
+
+    def __init__(self, writer, seat):
+        self.writer = writer
+        self.seat = seat
+        # Deltas only make sense on top of the previous tick, so a client starts with a keyframe
+        self.synced = False
+
+class RaceServer:
+    """Authoritative race: one headless Game per seat, stepped in lockstep and broadcast every tick.
+
+    A client whose socket backs up past max_buffer bytes is skipped and gets
+    a keyframe once it has drained, so one slow spectator never holds up
+    the race or grows the server's memory.
+    """
+    def __init__(self, seats=1, seed=None, tick_rate=None, max_buffer=64 * 1024):
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        self.tick_rate = tick_rate or CONFIG['FPS']
+        self.max_buffer = max_buffer
+        self.games = [self.new_game() for _ in range(seats)]
+        self.encoders = [SeatEncoder() for _ in range(seats)]
+        self.directions = [None] * seats
+        self.drivers = [None] * seats
+        self.clients = set()
+        self.tick = 0
+        self.stats = {'ticks': 0, 'encode': 0.0, 'encode_max': 0.0, 'broadcast': 0.0,
+                      'delta_bytes': 0, 'keyframes': 0, 'keyframe_bytes': 0, 'skipped': 0}
+        for game, encoder in zip(self.games, self.encoders):
+            encoder.update(game)
+
+    def new_game(self):
+        return Game.Game(seed=self.seed, timer=Game.SimClock(), headless=True)
+
+    async def handle(self, reader, writer):
+        """Serve one connection: seat it, then apply its input bytes until it disconnects."""
+        seat = self.drivers.index(None) if None in self.drivers else SPECTATOR
+        client = RemoteClient(writer, seat)
+        if seat != SPECTATOR:
+            self.drivers[seat] = client
+        writer.write(frame(WELCOME_MESSAGE.pack(WELCOME, seat, len(self.games))))
+        self.clients.add(client)
+        try:
+            while True:
+                data = await reader.read(64)
+                if not data:
+                    break
+                if seat == SPECTATOR:
+                    continue
+                for code in data:
+                    if code == RESTART:
+                        self.restart(seat)
+                    elif code < len(DIRECTIONS):
+                        self.directions[seat] = DIRECTIONS[code]
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            if seat != SPECTATOR:
+                self.drivers[seat] = None
+                self.directions[seat] = None
+            writer.close()
+
+    def restart(self, seat):
+        if self.games[seat].game_over:
+            self.games[seat] = self.new_game()
+            self.encoders[seat].reset()
+
+    def encode(self, kind):
+        """Frame the current tick for every seat, as a delta against the last tick or as a keyframe."""
+        parts = [FRAME.pack(kind, self.tick, len(self.games))]
+        for seat, encoder in enumerate(self.encoders):
+            if kind == DELTA:
+                changed, removed = encoder.update(self.games[seat])
+            else:
+                changed, removed = list(encoder.entities.items()), []
+            parts.append(encoder.pack(seat, changed, removed))
+        return frame(b"".join(parts))
+
+    def step(self):
+        """Advance every seat one tick and send the result to every client."""
+        for game, direction in zip(self.games, self.directions):
+            game.step(direction)
+        self.tick += 1
+        start = time.perf_counter()
+        delta = self.encode(DELTA)
+        keyframe = None
+        encoded = time.perf_counter()
+
+        stats = self.stats
+        for client in self.clients:
+            transport = client.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > self.max_buffer:
+                client.synced = False
+                stats['skipped'] += 1
+            elif client.synced:
+                client.writer.write(delta)
+            else:
+                if keyframe is None:
+                    keyframe = self.encode(KEYFRAME)
+                    stats['keyframes'] += 1
+                    stats['keyframe_bytes'] += len(keyframe)
+                client.writer.write(keyframe)
+                client.synced = True
+        done = time.perf_counter()
+
+        stats['ticks'] += 1
+        stats['encode'] += encoded - start
+        stats['encode_max'] = max(stats['encode_max'], encoded - start)
+        stats['broadcast'] += done - encoded
+        stats['delta_bytes'] += len(delta)
+
+    async def run(self, ticks=None):
+        """Step at tick_rate until ticks ticks have run, or forever."""
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        while ticks is None or self.tick < ticks:
+            self.step()
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < -interval * CONFIG['MAX_TICKS_PER_FRAME']:
+                # Too far behind to catch up: drop the time rather than burst
+                next_tick = loop.time()
+            await asyncio.sleep(max(0.0, delay))
+
+class RaceView:
+    """One seat as a client sees it: the player plus entities as last received."""
+    def __init__(self):
+        self.entities = {}
+        self.sprites = {}
+        self.scrolled = 0.0
+        self.player_state = (0.0, 0.0, 0.0, 0, False)
+        self.player = None
+
+    @property
+    def score(self):
+        return self.player_state[3]
+
+    @property
+    def game_over(self):
+        return self.player_state[4]
+
+    def clear(self):
+        self.entities.clear()
+        self.sprites.clear()
+
+    def sprite(self, entity_id, kind):
+        sprite = self.sprites.get(entity_id)
+        if sprite is None:
+            if kind == OPPONENT:
+                sprite = Game.Car(0, 0, Game.assets.image('opponent_car'), 0)
+            else:
+                obj_type = KIND_TYPES[kind]
+                sprite = Game.EnvironmentObject(0, 0, Game.assets.image(obj_type.value), obj_type)
+            self.sprites[entity_id] = sprite
+        return sprite
+
+    def draw(self, surface):
+        """Draw the seat the way Game.draw() does, from the received state only."""
+        if self.player is None:
+            self.player = Game.Car(WIDTH // 2 - CONFIG['CAR_WIDTH'] // 2, HEIGHT - 150,
+                                   Game.assets.image('player_car'), CONFIG['MAX_SPEED'], True)
+        player = self.player
+        player.x, player.angle, player.speed = self.player_state[:3]
+        cars = []
+        objects = []
+        for entity_id, (kind, x, y) in self.entities.items():
+            sprite = self.sprite(entity_id, kind)
+            sprite.x = x
+            if kind == OPPONENT:
+                sprite.y = y
+                cars.append(sprite)
+            else:
+                sprite.y = y + self.scrolled
+                objects.append(sprite)
+
+        queue = Game.render_queue
+        Game.road.enqueue(queue, (player.speed * 10) % (CONFIG['MARKER_HEIGHT'] * 2))
+        queue.submit(surface, 'background', False)
+        queue.add_objects('scenery', objects)
+        queue.submit(surface, 'scenery', False)
+        queue.add_cars('traffic', cars)
+        queue.submit(surface, 'traffic', False)
+        queue.add_cars('player', (player,))
+        queue.submit(surface, 'player', False)
+        Game.hud.enqueue(queue, self)
+        queue.submit(surface, 'hud', False)
+
+class RaceClient:
+    """Connection to a RaceServer that keeps a RaceView per seat up to date."""
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.seat = SPECTATOR
+        self.views = []
+        self.tick = 0
+        self.frames = 0
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        _, self.seat, seats = WELCOME_MESSAGE.unpack(await self.read())
+        self.views = [RaceView() for _ in range(seats)]
+
+    async def read(self):
+        size, = LENGTH.unpack(await self.reader.readexactly(LENGTH.size))
+        return await self.reader.readexactly(size)
+
+    async def receive(self):
+        """Apply frames until the server closes the connection."""
+        try:
+            while True:
+                self.apply(await self.read())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def apply(self, body):
+        kind, self.tick, seats = FRAME.unpack_from(body)
+        offset = FRAME.size
+        for _ in range(seats):
+            seat, scrolled, changed, removed = SEAT.unpack_from(body, offset)
+            offset += SEAT.size
+            view = self.views[seat]
+            if kind == KEYFRAME:
+                view.clear()
+            view.scrolled = scrolled
+            view.player_state = PLAYER.unpack_from(body, offset)
+            offset += PLAYER.size
+            entities = view.entities
+            for entity_id, entity_kind, x, y in ENTITY.iter_unpack(body[offset:offset + changed * ENTITY.size]):
+                entities[entity_id] = (entity_kind, x, y)
+            offset += changed * ENTITY.size
+            for entity_id in struct.unpack_from(f"<{removed}I", body, offset):
+                entities.pop(entity_id, None)
+                view.sprites.pop(entity_id, None)
+            offset += removed * 4
+        self.frames += 1
+
+    def send(self, direction):
+        self.writer.write(bytes((DIRECTION_CODES[direction],)))
+
+    def restart(self):
+        self.writer.write(bytes((RESTART,)))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+async def serve(host, port, seats, seed):
+    server = RaceServer(seats, seed)
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving a {seats}-seat race (seed {server.seed}) on {host}:{port}")
+    async with listener:
+        await server.run()
+
+async def play(host, port, fps):
+    """Windowed client: drive our seat (or watch seat 0, TAB to switch) and draw what arrives."""
+    Game.init_display()
+    client = RaceClient()
+    try:
+        await client.connect(host, port)
+    except OSError as e:
+        print(f"Failed to connect to {host}:{port}: {e}")
+        return
+    receiver = asyncio.create_task(client.receive())
+    watching = 0 if client.seat == SPECTATOR else client.seat
+    direction = None
+    running = True
+    while running and not receiver.done():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_q:
+                    running = False
+                elif event.key == pygame.K_r and client.seat != SPECTATOR:
+                    client.restart()
+                elif event.key == pygame.K_TAB and client.seat == SPECTATOR:
+                    watching = (watching + 1) % len(client.views)
+        if client.seat != SPECTATOR:
+            keys = pygame.key.get_pressed()
+            pressed = "left" if keys[pygame.K_LEFT] else "right" if keys[pygame.K_RIGHT] else None
+            if pressed != direction:
+                direction = pressed
+                client.send(direction)
+        client.views[watching].draw(Game.screen)
+        pygame.display.flip()
+        await asyncio.sleep(1.0 / fps)
+    client.close()
+    receiver.cancel()
+    pygame.quit()
+
+async def drive(client, rng):
+    """Self-test driver: random steering, restarting whenever its game ends."""
+    view = client.views[client.seat]
+    while True:
+        if view.game_over:
+            client.restart()
+        else:
+            client.send(rng.choice(DIRECTIONS))
+        await asyncio.sleep(rng.uniform(0.02, 0.2))
+
+async def selftest(clients=40, ticks=300, seats=2, seed=0, tick_rate=None):
+    """Run a race on loopback and check every client ends up with the server's state.
+
+    Half the clients join before the first tick and half join midway, so
+    keyframes and deltas are both exercised. Returns the number of clients
+    whose state does not match.
+    """
+    server = RaceServer(seats, seed, tick_rate)
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    rng = random.Random(seed)
+    connected = []
+    tasks = []
+
+    async def join(count):
+        for _ in range(count):
+            client = RaceClient()
+            await client.connect("127.0.0.1", port)
+            connected.append(client)
+            tasks.append(asyncio.create_task(client.receive()))
+            if client.seat != SPECTATOR:
+                tasks.append(asyncio.create_task(drive(client, random.Random(rng.random()))))
+
+    start = time.perf_counter()
+    await join(clients // 2)
+    race = asyncio.create_task(server.run(ticks))
+    while server.tick < ticks // 2:
+        await asyncio.sleep(0.01)
+    await join(clients - clients // 2)
+    await race
+    elapsed = time.perf_counter() - start
+
+    # Let the last frames arrive before comparing
+    deadline = time.perf_counter() + 5
+    while any(client.tick < server.tick for client in connected) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    mismatched = 0
+    for client in connected:
+        for seat, (view, encoder) in enumerate(zip(client.views, server.encoders)):
+            if client.tick != server.tick or view.entities != encoder.entities or \
+                    PLAYER.pack(*view.player_state) != PLAYER.pack(*encoder.player):
+                mismatched += 1
+                break
+
+    for task in tasks:
+        task.cancel()
+    for client in connected:
+        client.close()
+    # Give the server's handlers a moment to see the disconnects and finish
+    deadline = time.perf_counter() + 5
+    while server.clients and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    listener.close()
+    await listener.wait_closed()
+
+    stats = server.stats
+    print(f"{len(connected)} clients, {seats} seats, {stats['ticks']} ticks in {elapsed:.1f}s")
+    print(f"encode {stats['encode'] / stats['ticks'] * 1e6:.1f}us/tick (max {stats['encode_max'] * 1e6:.1f}us), "
+          f"broadcast {stats['broadcast'] / stats['ticks'] * 1e6:.1f}us/tick")
+    print(f"delta {stats['delta_bytes'] / stats['ticks']:.0f} bytes/tick, "
+          f"{stats['keyframes']} keyframes of {stats['keyframe_bytes'] / max(1, stats['keyframes']):.0f} bytes, "
+          f"{stats['skipped']} sends skipped for backed-up clients")
+    print(f"{len(connected) - mismatched}/{len(connected)} clients match the server state")
+    return mismatched
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve, join or self-test networked Simple Game races")
+    parser.add_argument("--host", default="127.0.0.1", help="address to serve on")
+    parser.add_argument("--port", type=int, default=8765, help="port to serve on")
+    parser.add_argument("--seats", type=int, default=2, help="driver seats; later clients spectate")
+    parser.add_argument("--seed", type=int, default=None, help="track seed shared by every seat")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="join a race in a window instead of serving")
+    parser.add_argument("--fps", type=int, default=CONFIG['FPS'], help="client frame rate")
+    parser.add_argument("--selftest", action="store_true", help="run a race with clients on loopback and verify them")
+    parser.add_argument("--clients", type=int, default=40, help="self-test clients")
+    parser.add_argument("--ticks", type=int, default=300, help="self-test ticks")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.selftest:
+            seed = 0 if args.seed is None else args.seed
+            return 1 if asyncio.run(selftest(args.clients, args.ticks, args.seats, seed)) else 0
+        if args.connect:
+            host, _, port = args.connect.rpartition(":")
+            asyncio.run(play(host or "127.0.0.1", int(port), args.fps))
+        else:
+            asyncio.run(serve(args.host, args.port, args.seats, args.seed))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))